@@ -8,15 +8,25 @@ This module provides AI capabilities for future features like:
 """
 
 import os
+import re
+import atexit
 import json
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from types import MappingProxyType
+from itertools import combinations
+from typing import List, Dict, Any, Optional, Tuple, Callable, NamedTuple, Union, Iterator, Generator
+from datetime import datetime, timezone
 
-# Optional AI dependencies
+# Optional AI dependencies. torch and transformers are heavy to import, so they
+# are loaded by _load_local_ai_modules() only when the local model is first used.
 try:
     import openai
-    import torch
-    from transformers import pipeline
     AI_AVAILABLE = True
 except ImportError as e:
     AI_AVAILABLE = False
@@ -25,7 +35,459 @@ except ImportError as e:
         class OpenAI:
             def __init__(self, api_key): pass
 
+# orjson parses model JSON several times faster than the standard library
+try:
+    import orjson
+
+    def _json_dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    _json_loads = orjson.loads
+    _JSON_DECODE_ERRORS = (orjson.JSONDecodeError, UnicodeDecodeError)
+except ImportError:
+    def _json_dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    _json_loads = json.loads
+    _JSON_DECODE_ERRORS = (json.JSONDecodeError, UnicodeDecodeError)
+
 from src.utils.config import Config
+from llm.response_cache import ResponseCache
+from llm.query_batcher import QueryBatcher, QueryItem
+
+LOCAL_MODEL_NAME = "microsoft/DialoGPT-small"  # Lightweight conversational model
+
+# Patterns used by the text extraction helpers, compiled once at import
+_HEART_RATE_RE = re.compile(r'heart rate[:\s]*(\d+)', re.IGNORECASE)
+_PR_INTERVAL_RE = re.compile(r'PR[:\s]*(?:interval[:\s]*)?(\d+)', re.IGNORECASE)
+_QRS_DURATION_RE = re.compile(r'QRS[:\s]*(\d+)', re.IGNORECASE)
+_LAB_VALUE_RES = [
+    re.compile(r'(\w+)[:\s]*(\d+(?:\.\d+)?)\s*([a-zA-Z/]+)'),  # Test: Value Unit
+    re.compile(r'(\w+)[:\s]*(\d+(?:\.\d+)?)'),  # Test: Value
+]
+# The same patterns over bytes, used for ASCII-only text (the usual OCR output)
+_LAB_VALUE_BYTES_RES = [re.compile(pattern.pattern.encode('ascii')) for pattern in _LAB_VALUE_RES]
+# Name Dose Unit, or Name - Dose Unit, in one pass
+_MEDICATION_RE = re.compile(r'(\w+)\s*(?:-\s*)?(\d+(?:\.\d+)?)\s*(mg|g|ml|mcg)', re.IGNORECASE)
+# Markdown code fence that models often wrap JSON answers in
+_JSON_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.DOTALL | re.IGNORECASE)
+
+
+
+def _compile_keywords(keywords: List[str]) -> re.Pattern:
+    """Compile a keyword list into one alternation so a text is scanned in a single pass"""
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in ordered))
+
+
+# Lookup tables below are read-only views, so a caller cannot alter them for every
+# later analysis by mistake.
+
+# Known interactions keyed by the alphabetically sorted pair of lowercase medication names
+_COMMON_INTERACTIONS = MappingProxyType({
+    tuple(sorted(pair)): interaction for pair, interaction in {
+        ("warfarin", "aspirin"): "Increased bleeding risk",
+        ("metformin", "alcohol"): "Risk of lactic acidosis",
+        ("statins", "grapefruit"): "Increased statin levels"
+    }.items()
+})
+# Every medication named in a known interaction
+_INTERACTING_MEDICATIONS = frozenset(name for pair in _COMMON_INTERACTIONS for name in pair)
+
+# Keyword scanners for the sentence/line helpers, matched against lowercased text
+_ABNORMAL_INDICATORS_RE = _compile_keywords(['high', 'low', 'abnormal', 'elevated', 'decreased', '*'])
+# Standalone H/L result flags, matched case-sensitively against the original lines
+_ABNORMAL_FLAG_RE = re.compile(r'(?<!\S)[HL](?!\S)')
+_MEDICAL_KEYWORDS_RE = _compile_keywords(['diagnosis', 'treatment', 'medication', 'follow-up', 'recommendation'])
+_ACTION_KEYWORDS_RE = _compile_keywords(['follow up', 'schedule', 'return', 'contact', 'monitor', 'continue', 'stop'])
+# Blood markers usually followed from one test to the next, as whole words
+_TRENDING_PARAMETERS_RE = re.compile(r'\b(?:%s)\b' % _compile_keywords([
+    'glucose', 'hba1c', 'cholesterol', 'ldl', 'hdl', 'triglycerides', 'hemoglobin',
+    'creatinine', 'egfr', 'tsh', 'ferritin', 'vitamin d', 'alt', 'ast', 'platelets'
+]).pattern)
+
+# Symptoms that call for urgent care. Single words are checked with a set lookup;
+# phrases go through the regex, which tolerates extra whitespace between words.
+_EMERGENCY_SINGLE_WORDS = frozenset({'unconscious', 'unresponsive', 'seizure', 'seizures'})
+_EMERGENCY_SYMPTOMS_RE = re.compile(
+    r'chest\s+pain|difficulty\s+breathing|severe\s+headache|loss\s+of\s+consciousness',
+    re.IGNORECASE
+)
+
+# Plain-language explanations for common medical terms, found in one scan of the text
+_MEDICAL_TERM_EXPLANATIONS = MappingProxyType({
+    'hypertension': 'High blood pressure',
+    'diabetes': 'High blood sugar condition',
+    'hyperlipidemia': 'High cholesterol',
+    'tachycardia': 'Fast heart rate',
+    'bradycardia': 'Slow heart rate'
+})
+_MEDICAL_TERMS_RE = _compile_keywords(list(_MEDICAL_TERM_EXPLANATIONS))
+
+# Keyword categories for the basic (non-AI) document analysis
+_DOCUMENT_KEYWORDS = MappingProxyType({
+    "medications": ("medication", "drug", "prescription", "pill", "tablet"),
+    "conditions": ("diagnosis", "condition", "disease", "syndrome"),
+    "results": ("result", "finding", "test", "level", "count")
+})
+_DOCUMENT_KEYWORDS_RE = _compile_keywords([word for words in _DOCUMENT_KEYWORDS.values() for word in words])
+
+# General advice returned when no AI service is available
+_GENERAL_HEALTH_RECOMMENDATIONS = (
+    "Maintain a balanced diet with fruits and vegetables",
+    "Exercise regularly (at least 30 minutes, 5 days a week)",
+    "Get adequate sleep (7-9 hours per night)",
+    "Stay hydrated throughout the day",
+    "Schedule regular check-ups with your healthcare provider",
+    "Take medications as prescribed",
+    "Monitor your health metrics regularly"
+)
+
+
+@lru_cache(maxsize=1)
+def _format_utc_second(second: int) -> str:
+    """Format a Unix time in whole seconds as a naive UTC ISO 8601 string"""
+    return datetime.fromtimestamp(second, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _utc_timestamp() -> str:
+    """Timestamp for analysis results; formatted once per second however many are made"""
+    return _format_utc_second(int(time.time()))
+
+
+def _safe_parse_json(text: str) -> Any:
+    """Parse a JSON model response, ignoring a surrounding code fence; None if invalid"""
+    fenced = _JSON_FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return _json_loads(text)
+    except _JSON_DECODE_ERRORS:
+        return None
+
+
+def _chunk_text(text: str, size: int, overlap: int) -> List[str]:
+    """Split text into pieces of at most `size` characters, each overlapping the previous"""
+    step = size - overlap
+    return [text[start:start + size] for start in range(0, max(len(text) - overlap, 1), step)]
+
+
+class _SplitText(NamedTuple):
+    """Text split into segments once, shared by the keyword helpers"""
+    segments: List[str]
+    lower_text: str
+    starts: List[int]
+
+
+def _tokenize_doc(text: str, separator: str = '.') -> _SplitText:
+    """Split text on `separator`, keeping the lowercased text and segment offsets"""
+    lower_text = text.lower()
+    starts = []
+    offset = 0
+    # Offsets come from the lowercased text, since lowercasing can change lengths
+    for segment in lower_text.split(separator):
+        starts.append(offset)
+        offset += len(segment) + len(separator)
+    return _SplitText(text.split(separator), lower_text, starts)
+
+
+def _segments_matching(doc: _SplitText, keywords_re: re.Pattern,
+                       case_sensitive_re: Optional[re.Pattern] = None) -> List[str]:
+    """
+    Return the stripped segments of a split text containing a keyword
+    
+    The lowercased text is scanned once and each hit is mapped back to its segment
+    by offset, instead of testing every keyword against every segment. Segments
+    matching `case_sensitive_re` in their original case are included as well.
+    """
+    hit_indexes = {bisect_right(doc.starts, match.start()) - 1
+                   for match in keywords_re.finditer(doc.lower_text)}
+    if case_sensitive_re is not None:
+        hit_indexes.update(index for index, segment in enumerate(doc.segments)
+                           if case_sensitive_re.search(segment))
+    return [doc.segments[index].strip() for index in sorted(hit_indexes)]
+
+
+def _canonical_terms(terms: List[str]) -> List[str]:
+    """
+    Normalize a list of user-entered terms into a canonical prompt order
+    
+    Lists that differ only in order, case, spacing or repeats produce the same
+    prompt, and therefore the same response cache key.
+    """
+    normalized = {" ".join(term.split()).lower() for term in terms}
+    normalized.discard("")
+    return sorted(normalized)
+
+
+# Loaded local pipelines by model name, shared by every service instance
+_LOCAL_MODEL_CACHE: Dict[str, Any] = {}
+_LOCAL_MODEL_LOCK = threading.Lock()
+
+# (torch, pipeline) once imported, False if unavailable, None before the first attempt
+_LOCAL_AI_MODULES = None
+
+# Worker processes for the text extractors, started on first use and shared by
+# every analysis. Below the size threshold the extractors run in-process, since
+# sending the text to a worker costs more than scanning it.
+PARALLEL_EXTRACTION_MIN_CHARS = 200_000
+_EXTRACTION_POOL: Optional[ProcessPoolExecutor] = None
+_EXTRACTION_POOL_LOCK = threading.Lock()
+
+
+def _load_local_ai_modules():
+    """Import torch and transformers on first use, returning (torch, pipeline) or None"""
+    global _LOCAL_AI_MODULES
+    if _LOCAL_AI_MODULES is None:
+        try:
+            import torch
+            from transformers import pipeline
+            _LOCAL_AI_MODULES = (torch, pipeline)
+        except ImportError:
+            _LOCAL_AI_MODULES = False
+    return _LOCAL_AI_MODULES or None
+
+
+@lru_cache(maxsize=1)
+def _cuda_available() -> bool:
+    """Probe for a CUDA device once; the probe can initialize the CUDA driver"""
+    local_ai_modules = _load_local_ai_modules()
+    if local_ai_modules is None:
+        return False
+    torch, _ = local_ai_modules
+    return torch.cuda.is_available()
+
+
+@lru_cache(maxsize=1)
+def _shared_http_client():
+    """
+    HTTP client shared by every OpenAI client, so connections are pooled and reused
+    
+    HTTP/2 is used when the optional h2 package is installed. Returns None if httpx
+    is unavailable, leaving the OpenAI client to create its own.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    
+    client = httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    )
+    atexit.register(client.close)
+    return client
+
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    """Get the shared extractor process pool, starting it on first use"""
+    global _EXTRACTION_POOL
+    with _EXTRACTION_POOL_LOCK:
+        if _EXTRACTION_POOL is None:
+            _EXTRACTION_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return _EXTRACTION_POOL
+
+SYSTEM_PROMPT = (
+    "You are a helpful health information assistant. Always emphasize consulting "
+    "healthcare professionals and never provide medical diagnoses."
+)
+
+# Task instructions are sent as the system message, ahead of any user data, so the
+# request prefix stays byte-identical between calls and qualifies for provider-side
+# prompt caching. Only the document text or user input goes in the user message.
+INTERACTION_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze potential interactions between the medications listed by the user.
+
+Please provide:
+1. Any known dangerous interactions
+2. Mild interactions to be aware of
+3. General recommendations
+
+Format the response as a structured analysis."""
+
+DOCUMENT_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the medical document provided by the user and extract key information.
+
+Please identify:
+1. Key findings or results
+2. Medications mentioned
+3. Diagnoses or conditions
+4. Important dates
+5. Follow-up recommendations
+
+Provide a structured summary."""
+
+# Map step for documents too long to send in one request; the excerpt notes are
+# then combined and analyzed with DOCUMENT_SYSTEM_PROMPT.
+DOCUMENT_EXCERPT_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+The user message is one excerpt of a longer medical document. List the findings or
+results, medications, diagnoses or conditions, dates and follow-up recommendations
+it mentions, as brief notes. Do not add anything that is not in the excerpt."""
+
+RECOMMENDATIONS_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Based on the health information provided by the user, provide personalized health recommendations.
+
+Please provide:
+1. General health tips
+2. Lifestyle recommendations
+3. Areas that might need attention
+4. Preventive care suggestions
+
+Keep recommendations general and emphasize consulting healthcare providers."""
+
+SYMPTOM_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+The user will list symptoms a person is experiencing.
+
+Please provide:
+1. General information about these symptoms
+2. When to seek medical attention
+3. Basic self-care suggestions
+4. Clear disclaimer that this is not medical advice
+
+IMPORTANT: Emphasize seeking professional medical advice and do not provide diagnosis."""
+
+ECG_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the ECG/EKG report provided by the user and extract key cardiac information.
+
+Please identify and explain:
+1. Heart rate and rhythm
+2. Any abnormalities detected
+3. Clinical significance of findings
+4. Recommendations for follow-up
+5. Key measurements (intervals, axes, etc.)
+
+Provide a clear, structured analysis that a patient can understand.
+Include appropriate medical disclaimers."""
+
+BLOOD_TEST_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the blood test results provided by the user and provide patient-friendly explanations.
+
+Please provide:
+1. Summary of all test values
+2. Which values are within/outside normal ranges
+3. Clinical significance of abnormal values
+4. Lifestyle factors that might influence results
+5. Recommendations for follow-up
+
+Use clear, non-technical language while remaining accurate."""
+
+PRESCRIPTION_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the prescription provided by the user and provide medication information.
+
+Please extract and explain:
+1. All medications prescribed (name, dosage, frequency)
+2. Purpose of each medication
+3. Important side effects to watch for
+4. Drug interactions to be aware of
+5. Instructions for taking medications
+6. Duration of treatment
+
+Provide clear, actionable information for the patient."""
+
+RADIOLOGY_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the radiology report provided by the user and provide patient-friendly explanations.
+
+Please explain:
+1. Type of imaging study performed
+2. Key findings in simple terms
+3. What normal vs abnormal findings mean
+4. Clinical significance of any abnormalities
+5. Recommended follow-up actions
+
+Translate medical terminology into understandable language."""
+
+LAB_REPORT_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the laboratory report provided by the user and provide comprehensive insights.
+
+Please provide:
+1. Summary of all test results
+2. Normal vs abnormal values with explanations
+3. Potential health implications
+4. Lifestyle recommendations based on results
+5. Questions to ask your healthcare provider
+
+Make the information accessible and actionable for patients."""
+
+GENERAL_DOCUMENT_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Analyze the medical document provided by the user and extract important information.
+
+Please provide:
+1. Document summary and purpose
+2. Key medical information
+3. Important dates and appointments
+4. Action items or follow-up requirements
+5. Questions to discuss with healthcare providers
+
+Organize the information in a patient-friendly format."""
+
+SUMMARY_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Create a concise 2-3 sentence summary of the medical document analysis provided by the user.
+
+Focus on the most important findings and recommendations."""
+
+# Documents longer than this are analyzed in overlapping excerpts. Sizes are in
+# characters, estimated at about 4 per token, so an excerpt is roughly 3000 tokens.
+DOCUMENT_CHUNK_CHARS = 12000
+DOCUMENT_CHUNK_OVERLAP_CHARS = 800
+DOCUMENT_CHUNK_WORKERS = 4
+
+# Longest prompt that may share a micro-batched request with other queries
+MICRO_BATCH_MAX_PROMPT_CHARS = 500
+
+# User message templates for the requests that wrap their input. Document analyzers
+# send the document text on its own, so they need no template.
+INTERACTION_USER_PROMPT = "Medications: {medications}"
+SYMPTOM_USER_PROMPT = "Symptoms: {symptoms}"
+SUMMARY_USER_PROMPT = "Document Type: {document_type}\nAnalysis: {analysis}"
+PROFILE_CONTEXT_LINE = "User Profile: Age range, medical conditions, medications"
+RECORDS_CONTEXT_LINE = "Recent health records: {count} entries"
+
+
+@lru_cache(maxsize=64)
+def _health_context(has_profile: bool, record_count: int) -> str:
+    """Build the health context string; it only depends on these two values"""
+    context_parts = []
+    
+    if has_profile:
+        context_parts.append(PROFILE_CONTEXT_LINE)
+    
+    if record_count:
+        context_parts.append(RECORDS_CONTEXT_LINE.format(count=record_count))
+    
+    return "\n".join(context_parts)
+
+
+# (system prompt, max tokens) for the AI request made by each document analyzer
+DOCUMENT_ANALYSIS_REQUESTS = {
+    'ecg': (ECG_SYSTEM_PROMPT, 1000),
+    'blood_test': (BLOOD_TEST_SYSTEM_PROMPT, 1200),
+    'prescription': (PRESCRIPTION_SYSTEM_PROMPT, 1000),
+    'radiology': (RADIOLOGY_SYSTEM_PROMPT, 1000),
+    'lab_report': (LAB_REPORT_SYSTEM_PROMPT, 1200),
+}
+GENERAL_DOCUMENT_REQUEST = (GENERAL_DOCUMENT_SYSTEM_PROMPT, 1000)
+
+# Batch API statuses after which a batch will never produce results
+BATCH_FAILED_STATUSES = frozenset({"failed", "expired", "cancelled"})
 
 
 class HealthLLMService:
@@ -33,44 +495,91 @@ class HealthLLMService:
     
     def __init__(self):
         self.config = Config()
+        self.llm_settings = self.config.get_llm_settings()
         self.openai_client = None
-        self.local_model = None
+        self._local_model = None
+        self._local_model_loaded = False
+        self._response_cache = None
+        self.prompt_cache_stats = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+        self._stats_lock = threading.Lock()
+        self.query_batcher = QueryBatcher(
+            self._request_completion,
+            self._request_completion_batch,
+            window_seconds=self.llm_settings['micro_batch_window_seconds'],
+            max_batch_size=self.llm_settings['micro_batch_max_size'],
+            max_batch_tokens=self.llm_settings['micro_batch_max_tokens']
+        )
         self.setup_models()
     
     def setup_models(self):
-        """Initialize AI models"""
+        """Initialize AI models (the local model is loaded on first use)"""
         if not AI_AVAILABLE:
             print("AI libraries not available. Document analysis will use basic text processing only.")
             return
-            
+        
+        self._setup_openai()
+    
+    def _setup_openai(self):
+        """Initialize the OpenAI client"""
         try:
             # Setup OpenAI (for production use)
             openai_key = os.getenv('OPENAI_API_KEY')
             if openai_key and openai_key != 'your_openai_api_key_here':
-                self.openai_client = openai.OpenAI(api_key=openai_key)
+                http_client = _shared_http_client()
+                if http_client is not None:
+                    self.openai_client = openai.OpenAI(api_key=openai_key, http_client=http_client)
+                else:
+                    self.openai_client = openai.OpenAI(api_key=openai_key)
                 print("OpenAI client initialized")
             else:
                 print("OpenAI API key not configured. AI features will use local models only.")
+        except Exception as e:
+            print(f"Error setting up OpenAI client: {e}")
+    
+    @property
+    def local_model(self):
+        """
+        Local model for privacy-sensitive tasks, loaded on first access
+        
+        Disabled unless HEALTH_ENABLE_LOCAL_LLM=1, so default runs never import torch.
+        The first access pays the one-time cost of importing torch and loading the
+        model weights; later accesses, from any instance, reuse the loaded pipeline.
+        """
+        if not self.llm_settings['local_model_enabled']:
+            return None
+        if not self._local_model_loaded:
+            self._local_model = self._setup_local_model()
+            self._local_model_loaded = True
+        return self._local_model
+    
+    def _setup_local_model(self):
+        """Load the local text-generation pipeline, reusing an already loaded one"""
+        with _LOCAL_MODEL_LOCK:
+            if LOCAL_MODEL_NAME in _LOCAL_MODEL_CACHE:
+                return _LOCAL_MODEL_CACHE[LOCAL_MODEL_NAME]
             
-            # Setup local model for privacy-sensitive tasks
-            if torch.cuda.is_available():
-                device = "cuda"
-            else:
-                device = "cpu"
+            local_ai_modules = _load_local_ai_modules()
+            if local_ai_modules is None:
+                print("Local model libraries (torch, transformers) not available.")
+                return None
+            _, pipeline = local_ai_modules
             
-            # Initialize a lightweight local model for basic tasks
             try:
-                self.local_model = pipeline(
+                device = "cuda" if _cuda_available() else "cpu"
+                
+                # Initialize a lightweight local model for basic tasks
+                local_model = pipeline(
                     "text-generation",
-                    model="microsoft/DialoGPT-small",  # Lightweight conversational model
+                    model=LOCAL_MODEL_NAME,
                     device=device
                 )
                 print(f"Local model initialized on {device}")
             except Exception as e:
                 print(f"Could not initialize local model: {e}")
-                
-        except Exception as e:
-            print(f"Error setting up AI models: {e}")
+                return None
+            
+            _LOCAL_MODEL_CACHE[LOCAL_MODEL_NAME] = local_model
+            return local_model
     
     def analyze_medication_interactions(self, medications: List[str]) -> Dict[str, Any]:
         """
@@ -81,21 +590,13 @@ class HealthLLMService:
                 return {"interactions": [], "warnings": []}
             
             # Create prompt for medication interaction analysis
-            medications_list = ", ".join(medications)
-            prompt = f"""
-            Analyze potential interactions between these medications: {medications_list}
-            
-            Please provide:
-            1. Any known dangerous interactions
-            2. Mild interactions to be aware of
-            3. General recommendations
-            
-            Format the response as a structured analysis.
-            """
+            medications_list = ", ".join(_canonical_terms(medications))
+            prompt = INTERACTION_USER_PROMPT.format(medications=medications_list)
             
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=500)
-                return self._parse_interaction_response(response)
+                response, usage = self._query_openai_with_usage(prompt, max_tokens=500, system_prompt=INTERACTION_SYSTEM_PROMPT,
+                                                                batchable=True)
+                return self._parse_interaction_response(response, usage)
             else:
                 # Fallback to local analysis or simple warnings
                 return self._basic_interaction_check(medications)
@@ -104,7 +605,8 @@ class HealthLLMService:
             print(f"Error analyzing medication interactions: {e}")
             return {"error": str(e)}
     
-    def analyze_health_document(self, document_text: str) -> Dict[str, Any]:
+    def analyze_health_document(self, document_text: str,
+                                on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Analyze medical documents and extract key information
         """
@@ -112,24 +614,11 @@ class HealthLLMService:
             if not document_text.strip():
                 return {"error": "No document text provided"}
             
-            prompt = f"""
-            Analyze this medical document and extract key information:
-            
-            {document_text}
-            
-            Please identify:
-            1. Key findings or results
-            2. Medications mentioned
-            3. Diagnoses or conditions
-            4. Important dates
-            5. Follow-up recommendations
-            
-            Provide a structured summary.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=800)
-                return self._parse_document_analysis(response)
+                if len(document_text) > DOCUMENT_CHUNK_CHARS:
+                    document_text = self._condense_long_document(document_text) or document_text
+                response, usage = self._query_openai_with_usage(document_text, max_tokens=800, system_prompt=DOCUMENT_SYSTEM_PROMPT, on_token=on_token)
+                return self._parse_document_analysis(response, usage)
             else:
                 return self._basic_document_analysis(document_text)
                 
@@ -137,6 +626,23 @@ class HealthLLMService:
             print(f"Error analyzing health document: {e}")
             return {"error": str(e)}
     
+    def _condense_long_document(self, document_text: str) -> str:
+        """
+        Reduce a document too long for one request to notes on each of its excerpts
+        
+        The excerpts are sent concurrently, since the requests are I/O-bound. The
+        combined notes are then analyzed in place of the full text.
+        """
+        chunks = _chunk_text(document_text, DOCUMENT_CHUNK_CHARS, DOCUMENT_CHUNK_OVERLAP_CHARS)
+        with ThreadPoolExecutor(max_workers=DOCUMENT_CHUNK_WORKERS) as executor:
+            notes = list(executor.map(
+                lambda chunk: self._query_openai(chunk, max_tokens=400, system_prompt=DOCUMENT_EXCERPT_SYSTEM_PROMPT),
+                chunks
+            ))
+        
+        return "\n\n".join(f"Excerpt {index} of {len(chunks)}:\n{note.strip()}"
+                           for index, note in enumerate(notes, start=1) if note.strip())
+    
     def get_health_recommendations(self, user_profile: Dict[str, Any], 
                                  recent_records: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -146,23 +652,9 @@ class HealthLLMService:
             # Create context from user profile and recent records
             context = self._build_health_context(user_profile, recent_records)
             
-            prompt = f"""
-            Based on this health information, provide personalized health recommendations:
-            
-            {context}
-            
-            Please provide:
-            1. General health tips
-            2. Lifestyle recommendations
-            3. Areas that might need attention
-            4. Preventive care suggestions
-            
-            Keep recommendations general and emphasize consulting healthcare providers.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=600)
-                return self._parse_recommendations(response)
+                response, usage = self._query_openai_with_usage(context, max_tokens=600, system_prompt=RECOMMENDATIONS_SYSTEM_PROMPT)
+                return self._parse_recommendations(response, usage)
             else:
                 return self._basic_health_recommendations(user_profile)
                 
@@ -178,23 +670,13 @@ class HealthLLMService:
             if not symptoms:
                 return {"error": "No symptoms provided"}
             
-            symptoms_text = ", ".join(symptoms)
-            
-            prompt = f"""
-            A person is experiencing these symptoms: {symptoms_text}
+            symptoms_text = ", ".join(_canonical_terms(symptoms))
             
-            Please provide:
-            1. General information about these symptoms
-            2. When to seek medical attention
-            3. Basic self-care suggestions
-            4. Clear disclaimer that this is not medical advice
-            
-            IMPORTANT: Emphasize seeking professional medical advice and do not provide diagnosis.
-            """
+            prompt = SYMPTOM_USER_PROMPT.format(symptoms=symptoms_text)
             
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=500)
-                return self._parse_symptom_assessment(response)
+                response, usage = self._query_openai_with_usage(prompt, max_tokens=500, system_prompt=SYMPTOM_SYSTEM_PROMPT)
+                return self._parse_symptom_assessment(response, usage)
             else:
                 return self._basic_symptom_guidance(symptoms)
                 
@@ -202,9 +684,12 @@ class HealthLLMService:
             print(f"Error in symptom assessment: {e}")
             return {"error": str(e)}
     
-    def analyze_document_comprehensive(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_document_comprehensive(self, document_data: Dict[str, Any],
+                                       on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Comprehensive document analysis with specialized handling for different document types
+        
+        If `on_token` is given, the AI analysis text is streamed to it as it is generated.
         """
         try:
             text_content = document_data.get('text_content', '')
@@ -216,46 +701,68 @@ class HealthLLMService:
             
             # Route to specialized analysis based on document type
             if document_type == 'ecg':
-                return self.analyze_ecg_report(text_content, metadata)
+                return self.analyze_ecg_report(text_content, metadata, on_token)
             elif document_type == 'blood_test':
-                return self.analyze_blood_test_results(text_content, metadata)
+                return self.analyze_blood_test_results(text_content, metadata, on_token)
             elif document_type == 'prescription':
-                return self.analyze_prescription(text_content, metadata)
+                return self.analyze_prescription(text_content, metadata, on_token)
             elif document_type == 'radiology':
-                return self.analyze_radiology_report(text_content, metadata)
+                return self.analyze_radiology_report(text_content, metadata, on_token)
             elif document_type == 'lab_report':
-                return self.analyze_lab_report(text_content, metadata)
+                return self.analyze_lab_report(text_content, metadata, on_token)
             else:
-                return self.analyze_general_medical_document(text_content, metadata)
+                return self.analyze_general_medical_document(text_content, metadata, on_token)
                 
         except Exception as e:
             print(f"Error in comprehensive document analysis: {e}")
             return {"error": str(e)}
     
-    def analyze_ecg_report(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_bundle(self, medications: List[str], document_text: str,
+                             user_profile: Dict[str, Any],
+                             recent_records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Run the interaction check, document analysis and recommendations concurrently
+        
+        The three requests are independent, so an event that needs all of them waits
+        for the slowest one rather than for all three in turn.
+        """
+        interactions, document_analysis, recommendations = await asyncio.gather(
+            asyncio.to_thread(self.analyze_medication_interactions, medications),
+            asyncio.to_thread(self.analyze_health_document, document_text),
+            asyncio.to_thread(self.get_health_recommendations, user_profile, recent_records)
+        )
+        return {
+            "interactions": interactions,
+            "document_analysis": document_analysis,
+            "recommendations": recommendations
+        }
+    
+    async def analyze_documents_batch(self, documents: List[Dict[str, Any]],
+                                      max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """
+        Run comprehensive analysis for several documents concurrently
+        
+        Results are returned in the same order as the input documents. The semaphore
+        bounds the number of in-flight API requests to stay within rate limits.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def analyze(document_data: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await asyncio.to_thread(self.analyze_document_comprehensive, document_data)
+        
+        return await asyncio.gather(*(analyze(document_data) for document_data in documents))
+    
+    def analyze_ecg_report(self, text_content: str, metadata: Dict[str, Any],
+                           on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze ECG/EKG reports"""
         try:
-            prompt = f"""
-            Analyze this ECG/EKG report and extract key cardiac information:
-            
-            {text_content}
-            
-            Please identify and explain:
-            1. Heart rate and rhythm
-            2. Any abnormalities detected
-            3. Clinical significance of findings
-            4. Recommendations for follow-up
-            5. Key measurements (intervals, axes, etc.)
-            
-            Provide a clear, structured analysis that a patient can understand.
-            Include appropriate medical disclaimers.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1000)
+                response, usage = self._query_document(text_content, DOCUMENT_ANALYSIS_REQUESTS['ecg'], on_token)
                 return {
                     "document_type": "ecg_analysis",
                     "analysis": response,
+                    "usage": usage,
                     "extracted_data": self._extract_ecg_data(text_content),
                     "recommendations": self._get_ecg_recommendations(response),
                     "disclaimer": "This analysis is for informational purposes only. Consult a cardiologist for medical interpretation."
@@ -266,32 +773,22 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"ECG analysis failed: {e}"}
     
-    def analyze_blood_test_results(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_blood_test_results(self, text_content: str, metadata: Dict[str, Any],
+                                   on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze blood test results"""
         try:
-            prompt = f"""
-            Analyze these blood test results and provide patient-friendly explanations:
-            
-            {text_content}
-            
-            Please provide:
-            1. Summary of all test values
-            2. Which values are within/outside normal ranges
-            3. Clinical significance of abnormal values
-            4. Lifestyle factors that might influence results
-            5. Recommendations for follow-up
-            
-            Use clear, non-technical language while remaining accurate.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1200)
+                response, usage = self._query_document(text_content, DOCUMENT_ANALYSIS_REQUESTS['blood_test'], on_token)
+                extracted = self._run_extractors(text_content, {
+                    "extracted_values": self._extract_lab_values,
+                    "abnormal_flags": self._identify_abnormal_values,
+                    "trending_data": self._suggest_trending_parameters,
+                })
                 return {
                     "document_type": "blood_test_analysis",
                     "analysis": response,
-                    "extracted_values": self._extract_lab_values(text_content),
-                    "abnormal_flags": self._identify_abnormal_values(text_content),
-                    "trending_data": self._suggest_trending_parameters(text_content),
+                    "usage": usage,
+                    **extracted,
                     "disclaimer": "Results should be discussed with your healthcare provider for proper medical interpretation."
                 }
             else:
@@ -300,34 +797,27 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"Blood test analysis failed: {e}"}
     
-    def analyze_prescription(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_prescription(self, text_content: str, metadata: Dict[str, Any],
+                             on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze prescription documents"""
         try:
-            prompt = f"""
-            Analyze this prescription and provide medication information:
-            
-            {text_content}
-            
-            Please extract and explain:
-            1. All medications prescribed (name, dosage, frequency)
-            2. Purpose of each medication
-            3. Important side effects to watch for
-            4. Drug interactions to be aware of
-            5. Instructions for taking medications
-            6. Duration of treatment
-            
-            Provide clear, actionable information for the patient.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1000)
                 medications = self._extract_medications_from_text(text_content)
                 
+                # The interaction check is an independent request, so run it alongside the main analysis
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    interaction_future = executor.submit(
+                        self.analyze_medication_interactions, [med['name'] for med in medications]
+                    )
+                    response, usage = self._query_document(text_content, DOCUMENT_ANALYSIS_REQUESTS['prescription'], on_token)
+                    interaction_check = interaction_future.result()
+                
                 return {
                     "document_type": "prescription_analysis",
                     "analysis": response,
+                    "usage": usage,
                     "medications": medications,
-                    "interaction_check": self.analyze_medication_interactions([med['name'] for med in medications]),
+                    "interaction_check": interaction_check,
                     "adherence_tips": self._get_medication_adherence_tips(medications),
                     "disclaimer": "Follow your doctor's instructions. Contact your healthcare provider with any concerns."
                 }
@@ -337,29 +827,16 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"Prescription analysis failed: {e}"}
     
-    def analyze_radiology_report(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_radiology_report(self, text_content: str, metadata: Dict[str, Any],
+                                 on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze radiology reports (X-ray, CT, MRI, etc.)"""
         try:
-            prompt = f"""
-            Analyze this radiology report and provide patient-friendly explanations:
-            
-            {text_content}
-            
-            Please explain:
-            1. Type of imaging study performed
-            2. Key findings in simple terms
-            3. What normal vs abnormal findings mean
-            4. Clinical significance of any abnormalities
-            5. Recommended follow-up actions
-            
-            Translate medical terminology into understandable language.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1000)
+                response, usage = self._query_document(text_content, DOCUMENT_ANALYSIS_REQUESTS['radiology'], on_token)
                 return {
                     "document_type": "radiology_analysis",
                     "analysis": response,
+                    "usage": usage,
                     "imaging_type": self._identify_imaging_type(text_content),
                     "key_findings": self._extract_radiology_findings(text_content),
                     "follow_up_needed": self._assess_follow_up_urgency(text_content),
@@ -371,29 +848,16 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"Radiology analysis failed: {e}"}
     
-    def analyze_lab_report(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_lab_report(self, text_content: str, metadata: Dict[str, Any],
+                           on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze general laboratory reports"""
         try:
-            prompt = f"""
-            Analyze this laboratory report and provide comprehensive insights:
-            
-            {text_content}
-            
-            Please provide:
-            1. Summary of all test results
-            2. Normal vs abnormal values with explanations
-            3. Potential health implications
-            4. Lifestyle recommendations based on results
-            5. Questions to ask your healthcare provider
-            
-            Make the information accessible and actionable for patients.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1200)
+                response, usage = self._query_document(text_content, DOCUMENT_ANALYSIS_REQUESTS['lab_report'], on_token)
                 return {
                     "document_type": "lab_report_analysis",
                     "analysis": response,
+                    "usage": usage,
                     "test_categories": self._categorize_lab_tests(text_content),
                     "critical_values": self._identify_critical_values(text_content),
                     "trend_recommendations": self._suggest_monitoring_schedule(text_content),
@@ -405,32 +869,23 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"Lab report analysis failed: {e}"}
     
-    def analyze_general_medical_document(self, text_content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_general_medical_document(self, text_content: str, metadata: Dict[str, Any],
+                                         on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analyze general medical documents"""
         try:
-            prompt = f"""
-            Analyze this medical document and extract important information:
-            
-            {text_content}
-            
-            Please provide:
-            1. Document summary and purpose
-            2. Key medical information
-            3. Important dates and appointments
-            4. Action items or follow-up requirements
-            5. Questions to discuss with healthcare providers
-            
-            Organize the information in a patient-friendly format.
-            """
-            
             if self.openai_client:
-                response = self._query_openai(prompt, max_tokens=1000)
+                response, usage = self._query_document(text_content, GENERAL_DOCUMENT_REQUEST, on_token)
+                # Split once and share the sentences between the extractors
+                extracted = self._run_extractors(text_content, {
+                    "key_points": self._extract_key_points,
+                    "action_items": self._identify_action_items,
+                    "medical_terms": self._explain_medical_terms,
+                }, argument=_tokenize_doc(text_content))
                 return {
                     "document_type": "general_medical_analysis",
                     "analysis": response,
-                    "key_points": self._extract_key_points(text_content),
-                    "action_items": self._identify_action_items(text_content),
-                    "medical_terms": self._explain_medical_terms(text_content),
+                    "usage": usage,
+                    **extracted,
                     "disclaimer": "This analysis is for informational purposes. Consult your healthcare provider for medical advice."
                 }
             else:
@@ -439,10 +894,168 @@ class HealthLLMService:
         except Exception as e:
             return {"error": f"Document analysis failed: {e}"}
     
-    def generate_document_summary(self, document_data: Dict[str, Any]) -> str:
-        """Generate a concise summary of the document analysis"""
+    def submit_document_batch(self, docs: List[Dict[str, Any]], job_id: str) -> Dict[str, Any]:
+        """
+        Submit document analyses to the OpenAI Batch API for non-interactive processing
+        
+        Batch requests cost less and do not count against the synchronous rate limits,
+        but complete within 24 hours rather than immediately. Each request's custom_id
+        is its response cache key, so documents already answered are not resubmitted.
+        Call poll_batch(job_id) later to collect the results. The job's manifest keeps
+        only each document's cache key and type, never its text.
+        """
+        try:
+            cache = self._get_response_cache()
+            if not self.openai_client or not cache:
+                return {"error": "Batch analysis requires the OpenAI client and the response cache"}
+            
+            manifest = {"job_id": job_id, "batch_id": None, "documents": []}
+            lines = []
+            pending_ids = set()
+            already_cached = 0
+            for document_data in docs:
+                text_content = document_data.get('text_content', '')
+                document_type = document_data.get('document_type', 'unknown')
+                if not text_content.strip():
+                    manifest["documents"].append({"custom_id": None, "document_type": document_type})
+                    continue
+                
+                system_prompt, max_tokens = self._document_request(document_data)
+                custom_id = self._response_cache_key(system_prompt, text_content, max_tokens)
+                manifest["documents"].append({"custom_id": custom_id, "document_type": document_type})
+                if custom_id in pending_ids:
+                    continue
+                if cache.get(custom_id) is not None:
+                    already_cached += 1
+                    continue
+                
+                pending_ids.add(custom_id)
+                lines.append(_json_dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.llm_settings['model'],
+                        "messages": [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": text_content}
+                        ],
+                        "max_tokens": max_tokens,
+                        "temperature": self.llm_settings['temperature']
+                    }
+                }))
+            
+            if lines:
+                batch_file = self.openai_client.files.create(
+                    file=(f"{job_id}.jsonl", "\n".join(lines).encode('utf-8')),
+                    purpose="batch"
+                )
+                batch = self.openai_client.batches.create(
+                    input_file_id=batch_file.id,
+                    endpoint="/v1/chat/completions",
+                    completion_window="24h"
+                )
+                manifest["batch_id"] = batch.id
+            
+            with open(self._batch_manifest_path(job_id), 'w', encoding='utf-8') as f:
+                f.write(_json_dumps(manifest))
+            
+            return {"job_id": job_id, "batch_id": manifest["batch_id"],
+                    "submitted": len(lines), "already_cached": already_cached}
+            
+        except Exception as e:
+            print(f"Error submitting document batch: {e}")
+            return {"error": str(e)}
+    
+    def poll_batch(self, job_id: str) -> Dict[str, Any]:
+        """
+        Check a submitted document batch and collect its results once complete
+        
+        Completed answers are stored in the response cache, so analyzing a document
+        afterwards with analyze_document_comprehensive uses its batch answer without a
+        new request. Results are returned in the order the documents were submitted,
+        as None for documents without an answer; their positions are listed under
+        "missing". The job is finished once collected, failed, expired or cancelled,
+        and its manifest is then deleted.
+        """
+        manifest_path = self._batch_manifest_path(job_id)
         try:
-            analysis = self.analyze_document_comprehensive(document_data)
+            try:
+                with open(manifest_path, 'rb') as f:
+                    manifest = _json_loads(f.read())
+            except FileNotFoundError:
+                return {"error": f"Unknown or already collected batch job: {job_id}"}
+            
+            answers = {}
+            if manifest["batch_id"]:
+                batch = self.openai_client.batches.retrieve(manifest["batch_id"])
+                if batch.status in BATCH_FAILED_STATUSES:
+                    os.remove(manifest_path)
+                    return {"job_id": job_id, "status": batch.status}
+                if batch.status != "completed":
+                    return {"job_id": job_id, "status": batch.status}
+                
+                if batch.output_file_id:
+                    output = self.openai_client.files.content(batch.output_file_id).text
+                    for line in output.splitlines():
+                        if not line.strip():
+                            continue
+                        item = _json_loads(line)
+                        response = item.get('response') or {}
+                        if response.get('status_code') != 200:
+                            continue
+                        content = response['body']['choices'][0]['message']['content']
+                        if content:
+                            answers[item['custom_id']] = content
+            
+            cache = self._get_response_cache()
+            results, missing = [], []
+            for index, document in enumerate(manifest["documents"]):
+                custom_id = document["custom_id"]
+                answer = answers.get(custom_id) if custom_id else None
+                if answer is not None:
+                    try:
+                        cache.set(custom_id, answer)
+                    except Exception as e:
+                        print(f"Response cache write failed: {e}")
+                elif custom_id:
+                    answer = cache.get(custom_id)
+                
+                if answer is None:
+                    # Failed in the batch, or evicted from the cache since submission
+                    results.append(None)
+                    missing.append(index)
+                else:
+                    results.append({"document_type": document["document_type"], "analysis": answer})
+            
+            os.remove(manifest_path)
+            return {"job_id": job_id, "status": "completed", "results": results, "missing": missing}
+            
+        except Exception as e:
+            print(f"Error polling document batch: {e}")
+            return {"error": str(e)}
+    
+    def _batch_manifest_path(self, job_id: str) -> str:
+        """Get the manifest file path for a submitted batch job"""
+        safe_job_id = re.sub(r'[^\w.-]', '_', job_id)
+        return os.path.join(self.config.llm_batches_dir, f"{safe_job_id}.json")
+    
+    @staticmethod
+    def _document_request(document_data: Dict[str, Any]) -> Tuple[str, int]:
+        """Get the (system prompt, max tokens) request made for a document's type"""
+        return DOCUMENT_ANALYSIS_REQUESTS.get(document_data.get('document_type'), GENERAL_DOCUMENT_REQUEST)
+    
+    def generate_document_summary(self, document_data: Dict[str, Any],
+                                  analysis: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate a concise summary of the document analysis
+        
+        Pass the result of analyze_document_comprehensive as `analysis` if it was
+        already run, so the document is not analyzed a second time.
+        """
+        try:
+            if analysis is None:
+                analysis = self.analyze_document_comprehensive(document_data)
             
             if "error" in analysis:
                 return f"Analysis Error: {analysis['error']}"
@@ -450,17 +1063,10 @@ class HealthLLMService:
             doc_type = analysis.get('document_type', 'unknown')
             analysis_text = analysis.get('analysis', '')
             
-            summary_prompt = f"""
-            Create a concise 2-3 sentence summary of this medical document analysis:
-            
-            Document Type: {doc_type}
-            Analysis: {analysis_text}
-            
-            Focus on the most important findings and recommendations.
-            """
+            summary_prompt = SUMMARY_USER_PROMPT.format(document_type=doc_type, analysis=analysis_text)
             
             if self.openai_client:
-                summary = self._query_openai(summary_prompt, max_tokens=200)
+                summary = self._query_openai(summary_prompt, max_tokens=200, system_prompt=SUMMARY_SYSTEM_PROMPT)
                 return summary.strip()
             else:
                 return f"Document processed: {doc_type}. {len(analysis_text)} characters of analysis generated."
@@ -468,50 +1074,306 @@ class HealthLLMService:
         except Exception as e:
             return f"Summary generation failed: {e}"
     
-    def _query_openai(self, prompt: str, max_tokens: int = 500) -> str:
-        """Query OpenAI API"""
+    def _get_response_cache(self) -> Optional[ResponseCache]:
+        """Get the persistent response cache, opening it on first use"""
+        if not self.llm_settings['response_cache_enabled']:
+            return None
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(
+                self.config.llm_cache_path,
+                default_ttl=self.llm_settings['response_cache_ttl_seconds'],
+                size_limit=self.llm_settings['response_cache_size_mb'] * 2 ** 20
+            )
+        return self._response_cache
+    
+    def _response_cache_key(self, system_prompt: str, prompt: str, max_tokens: int) -> str:
+        """Build the response cache key for a completion request"""
+        return ResponseCache.make_key(
+            model=self.llm_settings['model'], system=system_prompt, prompt=prompt,
+            max_tokens=max_tokens, temperature=self.llm_settings['temperature']
+        )
+    
+    def _query_document(self, text_content: str, request: Tuple[str, int],
+                        on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict[str, Any]]:
+        """Run a document analyzer's AI request, given as (system prompt, max tokens)"""
+        system_prompt, max_tokens = request
+        return self._query_openai_with_usage(text_content, max_tokens=max_tokens, system_prompt=system_prompt,
+                                             on_token=on_token)
+    
+    def _query_openai(self, prompt: str, max_tokens: int = 500,
+                      system_prompt: str = SYSTEM_PROMPT, batchable: bool = False,
+                      on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Query OpenAI API and return the response text"""
+        content, _ = self._query_openai_with_usage(prompt, max_tokens, system_prompt, batchable, on_token)
+        return content
+    
+    def _query_openai_stream(self, prompt: str, max_tokens: int = 500,
+                             system_prompt: str = SYSTEM_PROMPT) -> Iterator[str]:
+        """
+        Query OpenAI API, yielding the response text as it is generated
+        
+        A cached response is yielded in one piece. The response is cached only if it
+        is read to the end; stopping iteration early ends the request.
+        """
+        cache = self._get_response_cache()
+        cache_key = self._response_cache_key(system_prompt, prompt, max_tokens) if cache else None
+        
+        if cache:
+            try:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    yield cached
+                    return
+            except Exception as e:
+                print(f"Response cache read failed: {e}")
+        
+        parts = []
+        try:
+            for delta in self._stream_completion(system_prompt, prompt, max_tokens):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return
+        
+        content = "".join(parts)
+        if cache and content:
+            try:
+                cache.set(cache_key, content)
+            except Exception as e:
+                print(f"Response cache write failed: {e}")
+    
+    def _query_openai_with_usage(self, prompt: str, max_tokens: int = 500,
+                                 system_prompt: str = SYSTEM_PROMPT,
+                                 batchable: bool = False,
+                                 on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Query OpenAI API, serving repeated requests from the response cache
+        
+        The system prompt carries the static task instructions and the user prompt
+        only the variable input, so repeated calls share a cacheable prefix.
+        If `batchable` is set and the prompt is short, the query goes through the
+        micro-batcher and may share a request with concurrent queries that use the
+        same system prompt. Only set it for prompts without document or personal text.
+        If `on_token` is given, the response is streamed and each text fragment is
+        passed to it as it arrives; a cached response is passed in one piece.
+        
+        Returns the response text and the token usage of the request that produced it.
+        """
+        cache = self._get_response_cache()
+        cache_key = None
+        
+        if cache:
+            cache_key = self._response_cache_key(system_prompt, prompt, max_tokens)
+            try:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    if on_token:
+                        on_token(cached)
+                    return cached, self._usage_summary(None, response_cache_hit=True)
+            except Exception as e:
+                print(f"Response cache read failed: {e}")
+        
+        if on_token:
+            content, usage = self._request_streamed_completion(system_prompt, prompt, max_tokens, on_token)
+        elif batchable and len(prompt) <= MICRO_BATCH_MAX_PROMPT_CHARS:
+            content, usage = self.query_batcher.submit(system_prompt, prompt, max_tokens)
+        else:
+            content, usage = self._request_completion(system_prompt, prompt, max_tokens)
+        
+        # A batched answer was written for the combined prompt, so it is not
+        # cached as the answer to this prompt alone; nor is a broken-off stream
+        if cache and content and not usage.get('batch_size') and not usage.get('incomplete'):
+            try:
+                cache.set(cache_key, content)
+            except Exception as e:
+                print(f"Response cache write failed: {e}")
+        
+        return content, usage
+    
+    def _request_completion(self, system_prompt: str, prompt: str,
+                            max_tokens: int) -> Tuple[str, Dict[str, Any]]:
+        """Send a single chat completion request, returning the text and token usage"""
         try:
             response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.llm_settings['model'],
                 messages=[
-                    {"role": "system", "content": "You are a helpful health information assistant. Always emphasize consulting healthcare professionals and never provide medical diagnoses."},
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=max_tokens,
-                temperature=0.3
+                temperature=self.llm_settings['temperature']
             )
-            return response.choices[0].message.content
+            usage = self._usage_summary(response)
+            self._record_prompt_cache_usage(usage)
+            return response.choices[0].message.content, usage
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return "", self._usage_summary(None)
+    
+    def _request_streamed_completion(self, system_prompt: str, prompt: str, max_tokens: int,
+                                     on_token: Callable[[str], None]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Stream a chat completion, passing each text fragment to `on_token` as it arrives
+        
+        If the stream fails partway, or `on_token` raises, the text received so far is
+        returned with usage marked `incomplete`, so it is not cached as the answer.
+        """
+        parts = []
+        usage = self._usage_summary(None)
+        stream = self._stream_completion(system_prompt, prompt, max_tokens)
+        try:
+            while True:
+                delta = next(stream)
+                parts.append(delta)
+                on_token(delta)
+        except StopIteration as finished:
+            usage = finished.value
         except Exception as e:
             print(f"OpenAI API error: {e}")
-            return ""
+            stream.close()
+            usage['incomplete'] = True
+        return "".join(parts), usage
+    
+    def _stream_completion(self, system_prompt: str, prompt: str,
+                           max_tokens: int) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Yield the text fragments of a streamed chat completion, returning its token usage
+        
+        Closing the generator early closes the HTTP stream, so a caller that has seen
+        enough stops generation instead of waiting for `max_tokens` to be reached.
+        """
+        usage = self._usage_summary(None)
+        stream = self.openai_client.chat.completions.create(
+            model=self.llm_settings['model'],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=self.llm_settings['temperature'],
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in stream:
+                # The final chunk carries the usage totals and no choices
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = self._usage_summary(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            close = getattr(stream, 'close', None)
+            if callable(close):
+                close()
+        
+        self._record_prompt_cache_usage(usage)
+        return usage
+    
+    def _request_completion_batch(self, system_prompt: str,
+                                  items: List[QueryItem]) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Answer several prompts in one chat completion request
+        
+        Each answer carries an even share of the shared request's token usage.
+        Returns None if the response is not a JSON list with a text answer for every
+        task, so each caller can fall back to its own request.
+        """
+        tasks = "\n".join(f"{index}) {prompt}" for index, (prompt, _) in enumerate(items, start=1))
+        batch_prompt = (
+            "Answer each numbered task independently and return only a JSON list of "
+            "objects with \"id\" and \"answer\" keys:\n" + tasks
+        )
+        
+        content, usage = self._request_completion(
+            system_prompt, batch_prompt, sum(max_tokens for _, max_tokens in items)
+        )
+        try:
+            answers = {int(entry['id']): entry['answer'] for entry in _safe_parse_json(content)}
+            answers = [answers[index] for index in range(1, len(items) + 1)]
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Could not parse batched response: {e}")
+            return None
+        if not all(isinstance(answer, str) for answer in answers):
+            print("Could not parse batched response: an answer is not text")
+            return None
+        
+        return [(answer, self._usage_share(usage, index, len(items))) for index, answer in enumerate(answers)]
+    
+    @staticmethod
+    def _usage_share(usage: Dict[str, Any], index: int, batch_size: int) -> Dict[str, Any]:
+        """Split a batched request's token counts between its answers, so they add up to the total"""
+        share = dict(usage, batch_size=batch_size)
+        for key in ('prompt_tokens', 'completion_tokens', 'cached_tokens'):
+            quotient, remainder = divmod(usage[key], batch_size)
+            share[key] = quotient + (1 if index < remainder else 0)
+        return share
+    
+    @staticmethod
+    def _usage_summary(response, response_cache_hit: bool = False) -> Dict[str, Any]:
+        """Summarize token usage from an OpenAI response, including prompt cache hits"""
+        usage = getattr(response, 'usage', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        counts = {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0),
+            'completion_tokens': getattr(usage, 'completion_tokens', 0),
+            'cached_tokens': getattr(details, 'cached_tokens', 0),
+        }
+        summary = {key: value if isinstance(value, int) else 0 for key, value in counts.items()}
+        summary['response_cache_hit'] = response_cache_hit
+        return summary
+    
+    def _record_prompt_cache_usage(self, usage: Dict[str, Any]) -> None:
+        """Accumulate provider-side prompt cache hits reported in the response usage"""
+        with self._stats_lock:
+            self.prompt_cache_stats['requests'] += 1
+            self.prompt_cache_stats['prompt_tokens'] += usage['prompt_tokens']
+            self.prompt_cache_stats['cached_tokens'] += usage['cached_tokens']
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get response cache statistics (hits, misses, evictions and size) for monitoring"""
+        cache = self._get_response_cache()
+        if not cache:
+            return {"enabled": False}
+        try:
+            return dict(cache.get_stats(), enabled=True)
+        except Exception as e:
+            print(f"Could not read response cache stats: {e}")
+            return {"enabled": True, "error": str(e)}
+    
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """Get prompt cache hit statistics for the OpenAI requests made so far"""
+        with self._stats_lock:
+            stats = dict(self.prompt_cache_stats)
+        prompt_tokens = stats['prompt_tokens']
+        stats['hit_rate'] = stats['cached_tokens'] / prompt_tokens if prompt_tokens else 0.0
+        return stats
     
     def _basic_interaction_check(self, medications: List[str]) -> Dict[str, Any]:
         """Basic medication interaction check without AI"""
         # This is a simple fallback - in practice, you'd use a medical database
-        common_interactions = {
-            ("warfarin", "aspirin"): "Increased bleeding risk",
-            ("metformin", "alcohol"): "Risk of lactic acidosis",
-            ("statins", "grapefruit"): "Increased statin levels"
-        }
+        lowered = [med.lower() for med in medications]
+        # Only medications with a known interaction can form a matching pair. Sorting
+        # them by name makes every pair from combinations() a sorted table key.
+        candidates = sorted((name, i) for i, name in enumerate(lowered) if name in _INTERACTING_MEDICATIONS)
+        
+        matches = []
+        for (first, i), (second, j) in combinations(candidates, 2):
+            interaction = _COMMON_INTERACTIONS.get((first, second))
+            if interaction:
+                matches.append((min(i, j), max(i, j), interaction))
         
+        # Report pairs in the order the medications were given
         interactions = []
-        for i, med1 in enumerate(medications):
-            for med2 in medications[i+1:]:
-                key1 = (med1.lower(), med2.lower())
-                key2 = (med2.lower(), med1.lower())
-                
-                if key1 in common_interactions:
-                    interactions.append({
-                        "medications": [med1, med2],
-                        "interaction": common_interactions[key1],
-                        "severity": "moderate"
-                    })
-                elif key2 in common_interactions:
-                    interactions.append({
-                        "medications": [med1, med2],
-                        "interaction": common_interactions[key2],
-                        "severity": "moderate"
-                    })
+        for i, j, interaction in sorted(matches):
+            interactions.append({
+                "medications": [medications[i], medications[j]],
+                "interaction": interaction,
+                "severity": "moderate"
+            })
         
         return {
             "interactions": interactions,
@@ -520,48 +1382,34 @@ class HealthLLMService:
     
     def _basic_document_analysis(self, text: str) -> Dict[str, Any]:
         """Basic document analysis without AI"""
-        # Simple keyword extraction
-        keywords = {
-            "medications": ["medication", "drug", "prescription", "pill", "tablet"],
-            "conditions": ["diagnosis", "condition", "disease", "syndrome"],
-            "results": ["result", "finding", "test", "level", "count"]
-        }
-        
+        # Simple keyword extraction, all categories in one scan
+        counts = Counter(_DOCUMENT_KEYWORDS_RE.findall(text.lower()))
         findings = {}
-        for category, words in keywords.items():
-            findings[category] = []
-            for word in words:
-                if word in text.lower():
-                    findings[category].append(f"Contains {word} references")
+        keyword_counts = {}
+        for category, words in _DOCUMENT_KEYWORDS.items():
+            findings[category] = [f"Contains {word} references" for word in words if counts[word]]
+            keyword_counts[category] = {word: counts[word] for word in words if counts[word]}
         
         return {
             "summary": "Basic document analysis completed",
             "findings": findings,
+            "keyword_counts": keyword_counts,
             "recommendation": "Use AI analysis for detailed insights"
         }
     
     def _basic_health_recommendations(self, profile: Dict[str, Any]) -> Dict[str, Any]:
         """Basic health recommendations without AI"""
-        recommendations = [
-            "Maintain a balanced diet with fruits and vegetables",
-            "Exercise regularly (at least 30 minutes, 5 days a week)",
-            "Get adequate sleep (7-9 hours per night)",
-            "Stay hydrated throughout the day",
-            "Schedule regular check-ups with your healthcare provider",
-            "Take medications as prescribed",
-            "Monitor your health metrics regularly"
-        ]
-        
         return {
-            "general_recommendations": recommendations,
+            "general_recommendations": list(_GENERAL_HEALTH_RECOMMENDATIONS),
             "note": "These are general health tips. Consult your healthcare provider for personalized advice."
         }
     
     def _basic_symptom_guidance(self, symptoms: List[str]) -> Dict[str, Any]:
         """Basic symptom guidance without AI"""
-        emergency_keywords = ["chest pain", "difficulty breathing", "severe headache", "loss of consciousness"]
-        
-        urgent_care = any(keyword in " ".join(symptoms).lower() for keyword in emergency_keywords)
+        symptom_text = " ".join(symptoms)
+        words = {word.strip('.,;:!?') for word in symptom_text.lower().split()}
+        urgent_care = (not _EMERGENCY_SINGLE_WORDS.isdisjoint(words)
+                       or bool(_EMERGENCY_SYMPTOMS_RE.search(symptom_text)))
         
         return {
             "guidance": "Symptom information is available",
@@ -572,182 +1420,159 @@ class HealthLLMService:
     
     def _build_health_context(self, profile: Dict[str, Any], records: List[Dict[str, Any]]) -> str:
         """Build context string from health data"""
-        context_parts = []
-        
-        if profile:
-            context_parts.append(f"User Profile: Age range, medical conditions, medications")
-        
-        if records:
-            context_parts.append(f"Recent health records: {len(records)} entries")
-        
-        return "\n".join(context_parts)
+        return _health_context(bool(profile), len(records) if records else 0)
     
-    def _parse_interaction_response(self, response: str) -> Dict[str, Any]:
+    def _parse_interaction_response(self, response: str, usage: Dict[str, Any]) -> Dict[str, Any]:
         """Parse AI response for medication interactions"""
         # This would parse the AI response into structured data
         return {
             "interactions": [],
             "analysis": response,
-            "timestamp": datetime.utcnow().isoformat()
+            "usage": usage,
+            "timestamp": _utc_timestamp()
         }
     
-    def _parse_document_analysis(self, response: str) -> Dict[str, Any]:
+    def _parse_document_analysis(self, response: str, usage: Dict[str, Any]) -> Dict[str, Any]:
         """Parse AI response for document analysis"""
         return {
             "analysis": response,
-            "timestamp": datetime.utcnow().isoformat()
+            "usage": usage,
+            "timestamp": _utc_timestamp()
         }
     
-    def _parse_recommendations(self, response: str) -> Dict[str, Any]:
+    def _parse_recommendations(self, response: str, usage: Dict[str, Any]) -> Dict[str, Any]:
         """Parse AI response for health recommendations"""
         return {
             "recommendations": response,
-            "timestamp": datetime.utcnow().isoformat()
+            "usage": usage,
+            "timestamp": _utc_timestamp()
         }
     
-    def _parse_symptom_assessment(self, response: str) -> Dict[str, Any]:
+    def _parse_symptom_assessment(self, response: str, usage: Dict[str, Any]) -> Dict[str, Any]:
         """Parse AI response for symptom assessment"""
         return {
             "assessment": response,
             "disclaimer": "This is not medical advice. Always consult healthcare professionals.",
-            "timestamp": datetime.utcnow().isoformat()
+            "usage": usage,
+            "timestamp": _utc_timestamp()
         }
     
     # Helper methods for document analysis
+    def _run_extractors(self, text: str, extractors: Dict[str, Callable[[Any], Any]],
+                        argument: Any = None) -> Dict[str, Any]:
+        """
+        Run independent text extractors, keyed by result name
+        
+        Each extractor is called with `argument`, or with `text` if none is given.
+        Large documents are scanned by the shared process pool so the extractors use
+        separate cores; extractors must be static methods or module functions so they
+        can be sent to the workers.
+        """
+        if argument is None:
+            argument = text
+        
+        if len(text) >= PARALLEL_EXTRACTION_MIN_CHARS:
+            try:
+                pool = _get_extraction_pool()
+                futures = {name: pool.submit(extractor, argument) for name, extractor in extractors.items()}
+                return {name: future.result() for name, future in futures.items()}
+            except Exception as e:
+                # Process pools are unavailable on some platforms; scan in-process instead
+                print(f"Parallel extraction failed, running serially: {e}")
+        
+        return {name: extractor(argument) for name, extractor in extractors.items()}
+    
     def _extract_ecg_data(self, text: str) -> Dict[str, Any]:
         """Extract ECG-specific data from text"""
-        import re
-        
         data = {}
         
         # Extract heart rate
-        hr_match = re.search(r'heart rate[:\s]*(\d+)', text, re.IGNORECASE)
+        hr_match = _HEART_RATE_RE.search(text)
         if hr_match:
             data['heart_rate'] = int(hr_match.group(1))
         
         # Extract PR interval
-        pr_match = re.search(r'PR[:\s]*(interval[:\s]*)?(\d+)', text, re.IGNORECASE)
+        pr_match = _PR_INTERVAL_RE.search(text)
         if pr_match:
-            data['pr_interval'] = int(pr_match.group(2))
+            data['pr_interval'] = int(pr_match.group(1))
         
         # Extract QRS duration
-        qrs_match = re.search(r'QRS[:\s]*(\d+)', text, re.IGNORECASE)
+        qrs_match = _QRS_DURATION_RE.search(text)
         if qrs_match:
             data['qrs_duration'] = int(qrs_match.group(1))
         
         return data
     
-    def _extract_lab_values(self, text: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _extract_lab_values(text: str) -> List[Dict[str, Any]]:
         """Extract laboratory values from text"""
-        import re
-        
         values = []
         
-        # Common lab value patterns
-        patterns = [
-            r'(\w+)[:\s]*([\d.]+)\s*([a-zA-Z/]+)',  # Test: Value Unit
-            r'(\w+)[:\s]*([\d.]+)',  # Test: Value
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                if len(match) == 3:
-                    values.append({
-                        'test': match[0],
-                        'value': float(match[1]),
-                        'unit': match[2]
-                    })
-                elif len(match) == 2:
+        if text.isascii():
+            # Matching over bytes halves the memory scanned, and float() accepts bytes
+            data = text.encode('ascii')
+            for pattern in _LAB_VALUE_BYTES_RES:
+                for match in pattern.finditer(data):
+                    unit = match.group(3) if pattern.groups == 3 else b''
                     values.append({
-                        'test': match[0],
-                        'value': float(match[1]),
-                        'unit': ''
+                        'test': match.group(1).decode('ascii'),
+                        'value': float(match.group(2)),
+                        'unit': unit.decode('ascii')
                     })
+            return values
+        
+        for pattern in _LAB_VALUE_RES:
+            for match in pattern.finditer(text):
+                values.append({
+                    'test': match.group(1),
+                    'value': float(match.group(2)),
+                    'unit': match.group(3) if pattern.groups == 3 else ''
+                })
         
         return values
     
     def _extract_medications_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extract medication information from prescription text"""
-        import re
-        
         medications = []
         
-        # Common medication patterns
-        med_patterns = [
-            r'(\w+)\s*(\d+(?:\.\d+)?)\s*(mg|g|ml|mcg)',  # Name Dose Unit
-            r'(\w+)\s*-\s*(\d+)\s*(mg|g|ml|mcg)',  # Name - Dose Unit
-        ]
-        
-        for pattern in med_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                medications.append({
-                    'name': match[0],
-                    'dose': float(match[1]),
-                    'unit': match[2].lower()
-                })
+        for name, dose, unit in _MEDICATION_RE.findall(text):
+            medications.append({
+                'name': name,
+                'dose': float(dose),
+                'unit': unit.lower()
+            })
         
         return medications
     
-    def _identify_abnormal_values(self, text: str) -> List[str]:
+    @staticmethod
+    def _identify_abnormal_values(text: str) -> List[str]:
         """Identify values flagged as abnormal"""
-        abnormal_indicators = ['high', 'low', 'abnormal', 'elevated', 'decreased', '*', 'H', 'L']
-        abnormal_values = []
-        
-        lines = text.split('\n')
-        for line in lines:
-            if any(indicator in line.lower() for indicator in abnormal_indicators):
-                abnormal_values.append(line.strip())
-        
-        return abnormal_values
+        return _segments_matching(_tokenize_doc(text, '\n'), _ABNORMAL_INDICATORS_RE, _ABNORMAL_FLAG_RE)
+    
+    @staticmethod
+    def _suggest_trending_parameters(text: str) -> List[str]:
+        """Name the measured blood markers worth following across future tests"""
+        return list(dict.fromkeys(_TRENDING_PARAMETERS_RE.findall(text.lower())))
     
-    def _extract_key_points(self, text: str) -> List[str]:
-        """Extract key points from medical document"""
+    @staticmethod
+    def _extract_key_points(sentences: _SplitText) -> List[str]:
+        """Extract key points from a medical document split into sentences"""
         # Simple extraction - look for sentences with medical keywords
-        medical_keywords = ['diagnosis', 'treatment', 'medication', 'follow-up', 'recommendation']
-        
-        sentences = text.split('.')
-        key_points = []
-        
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in medical_keywords):
-                key_points.append(sentence.strip())
-        
+        key_points = _segments_matching(sentences, _MEDICAL_KEYWORDS_RE)
         return key_points[:5]  # Return top 5
     
-    def _identify_action_items(self, text: str) -> List[str]:
-        """Identify action items from medical document"""
-        action_keywords = ['follow up', 'schedule', 'return', 'contact', 'monitor', 'continue', 'stop']
-        
-        sentences = text.split('.')
-        actions = []
-        
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in action_keywords):
-                actions.append(sentence.strip())
-        
-        return actions
+    @staticmethod
+    def _identify_action_items(sentences: _SplitText) -> List[str]:
+        """Identify action items from a medical document split into sentences"""
+        return _segments_matching(sentences, _ACTION_KEYWORDS_RE)
     
-    def _explain_medical_terms(self, text: str) -> Dict[str, str]:
-        """Basic medical term explanations"""
+    @staticmethod
+    def _explain_medical_terms(text: Union[str, _SplitText]) -> Dict[str, str]:
+        """Basic medical term explanations for raw or already split text"""
         # This would ideally use a medical dictionary API
-        common_terms = {
-            'hypertension': 'High blood pressure',
-            'diabetes': 'High blood sugar condition',
-            'hyperlipidemia': 'High cholesterol',
-            'tachycardia': 'Fast heart rate',
-            'bradycardia': 'Slow heart rate'
-        }
+        text_lower = text.lower_text if isinstance(text, _SplitText) else text.lower()
         
-        found_terms = {}
-        text_lower = text.lower()
-        
-        for term, explanation in common_terms.items():
-            if term in text_lower:
-                found_terms[term] = explanation
-        
-        return found_terms
+        return {term: _MEDICAL_TERM_EXPLANATIONS[term] for term in _MEDICAL_TERMS_RE.findall(text_lower)}
     
     # Fallback methods for when AI is not available
     def _basic_ecg_analysis(self, text: str) -> Dict[str, Any]:
@@ -783,6 +1608,12 @@ class HealthLLMService:
         return {
             "document_type": "general_medical_analysis",
             "analysis": f"Medical document processed. {len(text)} characters extracted.",
-            "key_points": self._extract_key_points(text),
+            "key_points": self._extract_key_points(_tokenize_doc(text)),
             "disclaimer": "Consult healthcare providers for medical interpretation."
-        }
\ No newline at end of file
+        }
+
+
+@lru_cache(maxsize=1)
+def get_health_llm_service() -> HealthLLMService:
+    """Get the shared HealthLLMService instance"""
+    return HealthLLMService()
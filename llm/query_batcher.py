@@ -0,0 +1,116 @@
+"""
+Micro-batching for short LLM queries
+Concurrent queries that share a system prompt are coalesced into a single
+chat-completion request so they pay the per-call and system-prompt overhead once.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# (prompt, max_tokens) for one pending query
+QueryItem = Tuple[str, int]
+
+# Result given to a batched query whose batch could not be answered; the caller
+# then sends its own query from its own thread
+_RUN_SINGLY = object()
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent queries into batched requests
+
+    A query submitted while nothing else is in flight is sent straight away, so
+    sequential callers never wait on the batching window. Queries that arrive while
+    other requests are running are held for up to `window_seconds` (or until
+    `max_batch_size` are pending) and sent together. A batch never asks for more
+    than `max_batch_tokens` output tokens in total.
+    """
+
+    def __init__(self, execute_single: Callable[[str, str, int], Any],
+                 execute_batch: Callable[[str, List[QueryItem]], Optional[List[Any]]],
+                 window_seconds: float = 0.25, max_batch_size: int = 8,
+                 max_batch_tokens: int = 2000):
+        self.execute_single = execute_single
+        self.execute_batch = execute_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._pending: Dict[str, List[Tuple[QueryItem, Future]]] = {}
+
+    def submit(self, system_prompt: str, prompt: str, max_tokens: int) -> Any:
+        """Run a query, batching it with concurrent queries when possible"""
+        future = Future()
+        flush_now = False
+        full_group = None
+
+        with self._lock:
+            if self._in_flight == 0 and not self._pending or max_tokens > self.max_batch_tokens:
+                self._in_flight += 1
+                run_directly = True
+            else:
+                run_directly = False
+                group = self._pending.get(system_prompt)
+                if group and sum(tokens for (_, tokens), _ in group) + max_tokens > self.max_batch_tokens:
+                    # No room for this query's answer; send the pending ones now
+                    full_group = self._pending.pop(system_prompt)
+                    self._in_flight += 1
+                group = self._pending.setdefault(system_prompt, [])
+                group.append(((prompt, max_tokens), future))
+                if len(group) >= self.max_batch_size:
+                    flush_now = True
+                elif len(group) == 1:
+                    timer = threading.Timer(self.window_seconds, self._flush, args=(system_prompt,))
+                    timer.daemon = True
+                    timer.start()
+
+        if not run_directly:
+            if full_group:
+                self._send(system_prompt, full_group)
+            if flush_now:
+                self._flush(system_prompt)
+
+            result = future.result()
+            if result is not _RUN_SINGLY:
+                return result
+            with self._lock:
+                self._in_flight += 1
+
+        try:
+            return self.execute_single(system_prompt, prompt, max_tokens)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _flush(self, system_prompt: str) -> None:
+        """Send all pending queries for a system prompt"""
+        with self._lock:
+            group = self._pending.pop(system_prompt, None)
+            if not group:
+                return
+            self._in_flight += 1
+        self._send(system_prompt, group)
+
+    def _send(self, system_prompt: str, group: List[Tuple[QueryItem, Future]]) -> None:
+        """Answer a group taken from the pending queries, already counted as in flight"""
+        try:
+            answers = None
+            if len(group) > 1:
+                answers = self.execute_batch(system_prompt, [item for item, _ in group])
+
+            if answers is None or len(answers) != len(group):
+                # Single query, or the batched response could not be parsed:
+                # each caller sends its own query
+                answers = [_RUN_SINGLY] * len(group)
+
+            for (_, future), answer in zip(group, answers):
+                future.set_result(answer)
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
@@ -0,0 +1,197 @@
+"""
+Persistent response cache for LLM queries
+Stores completions in a local SQLite file keyed by a SHA256 digest of the request,
+so identical prompts are answered without another API round-trip.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    SQLite-backed key/value cache with per-entry expiry
+
+    If `size_limit` (in bytes) is set, the least frequently used entries are evicted
+    whenever the stored responses grow past it. The `memory_size` most recently used
+    entries are also kept in memory, so repeated lookups skip the database.
+    """
+
+    def __init__(self, db_path: str, default_ttl: Optional[float] = None,
+                 size_limit: Optional[int] = None, memory_size: int = 256):
+        self.db_path = db_path
+        self.default_ttl = default_ttl
+        self.size_limit = size_limit
+        self.memory_size = memory_size
+        self._connection = None
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        # Memory hits not yet added to the stored access counts
+        self._pending_accesses: Dict[str, int] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'memory_hits': 0}
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Build a stable cache key from the request parameters"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache database on first use"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "expires_at REAL)"
+            )
+            # Columns added for size-bounded eviction; older cache files lack them
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(responses)")}
+            if 'size' not in columns:
+                self._connection.execute(
+                    "ALTER TABLE responses ADD COLUMN size INTEGER NOT NULL DEFAULT 0"
+                )
+                self._connection.execute("UPDATE responses SET size = length(CAST(value AS BLOB))")
+            if 'access_count' not in columns:
+                self._connection.execute(
+                    "ALTER TABLE responses ADD COLUMN access_count INTEGER NOT NULL DEFAULT 0"
+                )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self._pending_accesses[key] = self._pending_accesses.get(key, 0) + 1
+                    self._stats['hits'] += 1
+                    self._stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self._stats['misses'] += 1
+                return None
+
+            connection.execute(
+                "UPDATE responses SET access_count = access_count + 1 WHERE key = ?", (key,)
+            )
+            connection.commit()
+            self._remember(key, value, expires_at)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: str, value: str, expire: Optional[float] = None) -> None:
+        """Store a value, expiring after `expire` seconds (defaults to the cache TTL)"""
+        ttl = expire if expire is not None else self.default_ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        size = len(value.encode('utf-8'))
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at, size, access_count) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, value, now, expires_at, size)
+            )
+            # Remember first so anything eviction removes is also dropped from memory
+            self._remember(key, value, expires_at)
+            if self.size_limit is not None:
+                self._evict(connection, now, key)
+            connection.commit()
+
+    def _remember(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        """Keep an entry in the in-memory layer, dropping the least recently used"""
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, connection: sqlite3.Connection, now: float, new_key: str) -> None:
+        """
+        Drop expired entries, then the least frequently used until under the size limit
+
+        The entry just written under `new_key` is never a victim: it has not had a
+        chance to be read yet, so it would otherwise always have the lowest count.
+        """
+        self._flush_accesses(connection)
+        connection.execute(
+            "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.size_limit:
+            return
+
+        # Ties go to the oldest entry
+        victims = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM responses WHERE key != ? ORDER BY access_count ASC, created_at ASC",
+            (new_key,)
+        ):
+            if total <= self.size_limit:
+                break
+            victims.append((key,))
+            total -= size
+
+        connection.executemany("DELETE FROM responses WHERE key = ?", victims)
+        for (key,) in victims:
+            self._memory.pop(key, None)
+        self._stats['evictions'] += len(victims)
+
+    def _flush_accesses(self, connection: sqlite3.Connection) -> None:
+        """Add memory hits to the stored access counts used for eviction"""
+        if self._pending_accesses:
+            connection.executemany(
+                "UPDATE responses SET access_count = access_count + ? WHERE key = ?",
+                [(count, key) for key, count in self._pending_accesses.items()]
+            )
+            self._pending_accesses.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit, miss and eviction counts plus the stored size in bytes"""
+        with self._lock:
+            connection = self._connect()
+            entries, size_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            stats = dict(self._stats)
+
+        stats['entries'] = entries
+        stats['size_bytes'] = size_bytes
+        stats['size_limit_bytes'] = self.size_limit
+        return stats
+
+    def close(self) -> None:
+        """Close the underlying database connection"""
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._flush_accesses(self._connection)
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
@@ -7,6 +7,8 @@ medical reports, and medication notifications.
 
 import os
 import sys
+import logging
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 # Add src directory to Python path
@@ -24,6 +26,20 @@ from services.database_service import DatabaseService
 from services.notification_service import NotificationService
 from utils.config import Config
 
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+def configure_logging(config: Config):
+    """Send application logs to a rotating file in the data directory"""
+    handler = RotatingFileHandler(config.log_path, maxBytes=LOG_MAX_BYTES,
+                                  backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.INFO)
+
 
 class HealthApp(MDApp):
     """Main Health Management Application"""
@@ -41,6 +57,7 @@ class HealthApp(MDApp):
         
         # Initialize services
         self.config = Config()
+        configure_logging(self.config)
         self.db_service = DatabaseService()
         self.notification_service = NotificationService()
         self.notification_service.set_database_service(self.db_service)
@@ -2,17 +2,49 @@
 Main application controller
 """
 
+import importlib
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
+from kivy.clock import Clock
 from kivy.uix.screenmanager import ScreenManager
 from typing import Dict, Any
 
-from src.views.home_screen import HomeScreen
-from src.views.profile_screen import ProfileScreen
-from src.views.medications_screen import MedicationsScreen
-from src.views.reports_screen import ReportsScreen
-from src.views.appointments_screen import AppointmentsScreen
-from src.views.health_records_screen import HealthRecordsScreen
-from src.views.document_analysis_screen import DocumentAnalysisScreen
-from src.views.settings_screen import SettingsScreen
+from src.services.database_service import data_version
+
+logger = logging.getLogger(__name__)
+
+# Screen classes by screen name, as "module:Class". Screens are imported and built
+# the first time they are shown, so startup only pays for the home screen.
+SCREEN_CLASSES = {
+    'home': 'src.views.home_screen:HomeScreen',
+    'profile': 'src.views.profile_screen:ProfileScreen',
+    'medications': 'src.views.medications_screen:MedicationsScreen',
+    'reports': 'src.views.reports_screen:ReportsScreen',
+    'appointments': 'src.views.appointments_screen:AppointmentsScreen',
+    'health_records': 'src.views.health_records_screen:HealthRecordsScreen',
+    'document_analysis': 'src.views.document_analysis_screen:DocumentAnalysisScreen',
+    'settings': 'src.views.settings_screen:SettingsScreen',
+}
+
+# Tables each screen lists. A screen is only refreshed on navigation when one of
+# its tables was written since it was last shown; screens not listed always refresh.
+SCREEN_DATA_TABLES = {
+    'home': ('medications', 'appointments'),
+    'profile': ('users',),
+    'medications': ('medications',),
+    'reports': ('medical_reports',),
+    'appointments': ('appointments',),
+    'health_records': ('health_records',),
+    'settings': ('settings',),
+}
+# Refresh anyway after this many seconds, since listings like upcoming
+# appointments also depend on the current time
+SCREEN_REFRESH_MAX_AGE = 300
+
+# Document analyses run off the UI thread; a couple can proceed at once
+ANALYSIS_WORKERS = 2
 
 
 class AppController:
@@ -22,58 +54,103 @@ class AppController:
         self.app = app
         self.current_user = None
         self.screens = {}
+        self.screen_manager = None
+        # (data version, monotonic time) each screen was last refreshed at
+        self._screen_versions = {}
+        self.analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS,
+                                                    thread_name_prefix='document-analysis')
         
     def setup_screens(self, screen_manager: ScreenManager):
-        """Setup all application screens"""
-        
-        # Initialize screens
-        self.screens = {
-            'home': HomeScreen(name='home', controller=self),
-            'profile': ProfileScreen(name='profile', controller=self),
-            'medications': MedicationsScreen(name='medications', controller=self),
-            'reports': ReportsScreen(name='reports', controller=self),
-            'appointments': AppointmentsScreen(name='appointments', controller=self),
-            'health_records': HealthRecordsScreen(name='health_records', controller=self),
-            'document_analysis': DocumentAnalysisScreen(name='document_analysis', controller=self),
-            'settings': SettingsScreen(name='settings', controller=self),
-        }
+        """Setup the screen manager with the initial screen"""
+        self.screen_manager = screen_manager
+        self.screens = {}
         
-        # Add screens to manager
-        for screen in self.screens.values():
-            screen_manager.add_widget(screen)
+        # Other screens are created on first navigation
+        self.get_screen('home')
         
         # Set initial screen
         screen_manager.current = 'home'
         
         return screen_manager
     
+    def get_screen(self, screen_name: str):
+        """Get a screen, importing and creating it on first use"""
+        screen = self.screens.get(screen_name)
+        if screen is None and screen_name in SCREEN_CLASSES:
+            module_name, class_name = SCREEN_CLASSES[screen_name].split(':')
+            screen_class = getattr(importlib.import_module(module_name), class_name)
+            screen = screen_class(name=screen_name, controller=self)
+            self.screens[screen_name] = screen
+            self.screen_manager.add_widget(screen)
+        return screen
+    
     def navigate_to(self, screen_name: str):
         """Navigate to a specific screen"""
-        if screen_name in self.screens:
+        screen = self.get_screen(screen_name)
+        if screen is not None:
             self.app.root.current = screen_name
             
             # Refresh screen data if needed
-            screen = self.screens[screen_name]
-            if hasattr(screen, 'refresh_data'):
+            if hasattr(screen, 'refresh_data') and self._needs_refresh(screen_name):
                 screen.refresh_data()
         else:
-            print(f"Screen '{screen_name}' not found")
+            logger.warning("Screen '%s' not found", screen_name)
+    
+    def _needs_refresh(self, screen_name: str) -> bool:
+        """Check whether a screen's data changed since it was last refreshed"""
+        tables = SCREEN_DATA_TABLES.get(screen_name)
+        if tables is None:
+            return True
+        
+        version = data_version(*tables)
+        now = time.monotonic()
+        last = self._screen_versions.get(screen_name)
+        if last is not None and last[0] == version and now - last[1] < SCREEN_REFRESH_MAX_AGE:
+            return False
+        
+        self._screen_versions[screen_name] = (version, now)
+        return True
+    
+    # Services are resolved from the app once and then read from the instance
+    @cached_property
+    def database_service(self):
+        """Database service instance"""
+        return self.app.db_service
+    
+    @cached_property
+    def notification_service(self):
+        """Notification service instance"""
+        return self.app.notification_service
+    
+    @cached_property
+    def config(self):
+        """Configuration instance"""
+        return self.app.config
+    
+    @cached_property
+    def document_service(self):
+        """Document service instance, created on first use"""
+        if not hasattr(self.app, 'document_service'):
+            from src.services.document_service import DocumentService
+            self.app.document_service = DocumentService(self.database_service)
+        return self.app.document_service
     
     def get_database_service(self):
         """Get database service instance"""
-        return self.app.db_service
+        return self.database_service
     
     def get_notification_service(self):
         """Get notification service instance"""
-        return self.app.notification_service
+        return self.notification_service
     
     def get_config(self):
         """Get configuration instance"""
-        return self.app.config
+        return self.config
     
     def set_current_user(self, user):
         """Set the current user"""
         self.current_user = user
+        self._screen_versions.clear()
     
     def get_current_user(self):
         """Get the current user"""
@@ -82,49 +159,62 @@ class AppController:
     def show_message(self, title: str, message: str):
         """Show a message dialog"""
         # This would show a popup dialog
-        print(f"{title}: {message}")
+        logger.info("%s: %s", title, message)
         
         # Send notification
-        if self.app.notification_service:
-            self.app.notification_service.send_custom_notification(title, message)
+        if self.notification_service:
+            self.notification_service.send_custom_notification(title, message)
     
     def handle_error(self, error: Exception, context: str = ""):
         """Handle application errors"""
-        error_message = f"Error in {context}: {str(error)}" if context else str(error)
-        print(f"APPLICATION ERROR: {error_message}")
+        if context:
+            logger.error("Error in %s: %s", context, error)
+        else:
+            logger.error("%s", error)
         self.show_message("Error", "An error occurred. Please try again.")
     
     def on_app_pause(self):
         """Handle app pause event"""
-        print("App paused")
+        logger.info("App paused")
         # Save any pending changes
+        self.database_service.release_sessions()
         
     def on_app_resume(self):
         """Handle app resume event"""
-        print("App resumed")
+        logger.info("App resumed")
         # Refresh data if needed
+        screen = self.screens.get(self.app.root.current)
+        if hasattr(screen, 'refresh_data'):
+            screen.refresh_data()
     
     def get_document_service(self):
         """Get document service instance"""
-        if not hasattr(self.app, 'document_service'):
-            from src.services.document_service import DocumentService
-            self.app.document_service = DocumentService()
-        return self.app.document_service
+        return self.document_service
     
-    def analyze_document(self, file_path: str, callback=None):
-        """Analyze a document and optionally call callback with results"""
-        try:
-            document_service = self.get_document_service()
-            user_id = self.current_user.id if self.current_user else 1
-            
-            # Perform analysis
-            result = document_service.analyze_document_complete(file_path, user_id)
-            
-            if callback:
-                callback(result)
-            
-            return result
+    def analyze_document(self, file_path: str, callback=None) -> Future:
+        """
+        Analyze a document on a worker thread so the UI stays responsive
+        
+        Returns a Future for the result. If given, `callback` is called with the
+        result on the main thread.
+        """
+        user_id = self.current_user.id if self.current_user else 1
+        
+        future = self.analysis_executor.submit(
+            self._run_document_analysis, self.document_service, file_path, user_id
+        )
+        if callback:
+            def on_done(done: Future):
+                if not done.cancelled():
+                    Clock.schedule_once(lambda dt: callback(done.result()), 0)
             
+            future.add_done_callback(on_done)
+        return future
+    
+    def _run_document_analysis(self, document_service, file_path: str, user_id: int):
+        """Perform document analysis on a worker thread"""
+        try:
+            return document_service.analyze_document_complete(file_path, user_id)
         except Exception as e:
             self.handle_error(e, "document analysis")
             return {"error": str(e), "success": False}
@@ -132,9 +222,8 @@ class AppController:
     def get_user_documents(self, limit: int = 50):
         """Get user's documents"""
         try:
-            document_service = self.get_document_service()
             user_id = self.current_user.id if self.current_user else 1
-            return document_service.get_user_documents(user_id, limit)
+            return self.document_service.get_user_documents(user_id, limit)
         except Exception as e:
             self.handle_error(e, "getting user documents")
             return []
@@ -142,9 +231,8 @@ class AppController:
     def search_documents(self, query: str, document_type: str = None):
         """Search user's documents"""
         try:
-            document_service = self.get_document_service()
             user_id = self.current_user.id if self.current_user else 1
-            return document_service.search_documents(user_id, query, document_type)
+            return self.document_service.search_documents(user_id, query, document_type)
         except Exception as e:
             self.handle_error(e, "searching documents")
             return []
@@ -152,19 +240,8 @@ class AppController:
     def get_document_details(self, document_id: int):
         """Get detailed information about a document"""
         try:
-            document_service = self.get_document_service()
             user_id = self.current_user.id if self.current_user else 1
-            return document_service.get_document_details(document_id, user_id)
+            return self.document_service.get_document_details(document_id, user_id)
         except Exception as e:
             self.handle_error(e, "getting document details")
             return None
-    
-
-        """Handle app resume event"""
-        print("App resumed")
-        # Refresh data if needed
-        current_screen = self.app.root.current
-        if current_screen in self.screens:
-            screen = self.screens[current_screen]
-            if hasattr(screen, 'refresh_data'):
-                screen.refresh_data()
\ No newline at end of file
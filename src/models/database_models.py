@@ -2,13 +2,61 @@
 Database models for the Health Management App
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+import enum
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, Index, JSON, FetchedValue, TypeDecorator, func
+from sqlalchemy.orm import DeclarativeBase, deferred, relationship, sessionmaker
 from datetime import datetime
 from typing import Optional
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    """Declarative base shared by all models"""
+
+
+class MedicationLogStatus(enum.IntEnum):
+    """Outcome of a scheduled medication dose"""
+    PENDING = 0
+    TAKEN = 1
+    MISSED = 2
+    DELAYED = 3
+
+
+class AppointmentStatus(enum.IntEnum):
+    """State of an appointment"""
+    SCHEDULED = 0
+    COMPLETED = 1
+    CANCELLED = 2
+
+
+class AnalysisStatus(enum.IntEnum):
+    """State of a document analysis"""
+    PROCESSING = 0
+    COMPLETED = 1
+    FAILED = 2
+
+
+class TagType(enum.IntEnum):
+    """Source of a document tag"""
+    USER = 0
+    SYSTEM = 1
+    AI = 2
+
+
+class IntEnumColumn(TypeDecorator):
+    """Stores an IntEnum as its integer value"""
+    impl = Integer
+    cache_ok = True
+    
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(self.enum_class(value))
+    
+    def process_result_value(self, value, dialect):
+        # Columns created as VARCHAR before this type hand back the digits as text
+        return None if value is None else self.enum_class(int(value))
 
 
 class User(Base):
@@ -28,8 +76,8 @@ class User(Base):
     emergency_contact = Column(String(100))
     allergies = Column(Text)
     medical_conditions = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
     medications = relationship("Medication", back_populates="user")
@@ -42,6 +90,9 @@ class User(Base):
 class Medication(Base):
     """Medication model for managing medicines"""
     __tablename__ = 'medications'
+    __table_args__ = (
+        Index('ix_medications_user_active', 'user_id', 'is_active'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -54,9 +105,9 @@ class Medication(Base):
     side_effects = Column(Text)
     is_active = Column(Boolean, default=True)
     reminder_enabled = Column(Boolean, default=True)
-    reminder_times = Column(String(200))  # JSON string of reminder times
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    reminder_times = Column(JSON(none_as_null=True))  # list of "HH:MM" reminder times
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
     user = relationship("User", back_populates="medications")
@@ -66,14 +117,17 @@ class Medication(Base):
 class MedicationLog(Base):
     """Log for tracking medication intake"""
     __tablename__ = 'medication_logs'
+    __table_args__ = (
+        Index('ix_medication_logs_medication_scheduled', 'medication_id', 'scheduled_time'),
+    )
     
     id = Column(Integer, primary_key=True)
     medication_id = Column(Integer, ForeignKey('medications.id'), nullable=False)
     scheduled_time = Column(DateTime, nullable=False)
     taken_time = Column(DateTime)
-    status = Column(String(20), default='pending')  # pending, taken, missed, delayed
+    status = Column(IntEnumColumn(MedicationLogStatus), default=MedicationLogStatus.PENDING)
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     medication = relationship("Medication", back_populates="medication_logs")
@@ -82,6 +136,9 @@ class MedicationLog(Base):
 class MedicalReport(Base):
     """Medical reports and documents"""
     __tablename__ = 'medical_reports'
+    __table_args__ = (
+        Index('ix_medical_reports_user_date', 'user_id', 'report_date'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -96,8 +153,8 @@ class MedicalReport(Base):
     description = Column(Text)
     tags = Column(String(200))  # comma-separated tags
     is_critical = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
     user = relationship("User", back_populates="medical_reports")
@@ -106,6 +163,11 @@ class MedicalReport(Base):
 class Appointment(Base):
     """Medical appointments"""
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Upcoming appointments filter on status, so it sits between the user and
+        # the date range and the index also gives the date ordering
+        Index('ix_appointments_user_status_date', 'user_id', 'status', 'appointment_date'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -115,12 +177,12 @@ class Appointment(Base):
     appointment_date = Column(DateTime, nullable=False)
     duration = Column(Integer)  # in minutes
     type = Column(String(50))  # consultation, checkup, follow-up, etc.
-    status = Column(String(20), default='scheduled')  # scheduled, completed, cancelled
+    status = Column(IntEnumColumn(AppointmentStatus), default=AppointmentStatus.SCHEDULED)
     reminder_enabled = Column(Boolean, default=True)
-    reminder_minutes = Column(String(50))  # JSON string of reminder minutes
+    reminder_minutes = Column(JSON(none_as_null=True))  # list of minutes before the appointment
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
     user = relationship("User", back_populates="appointments")
@@ -129,6 +191,9 @@ class Appointment(Base):
 class HealthRecord(Base):
     """Health measurements and vitals"""
     __tablename__ = 'health_records'
+    __table_args__ = (
+        Index('ix_health_records_user_date', 'user_id', 'measured_date'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -137,7 +202,7 @@ class HealthRecord(Base):
     unit = Column(String(20))
     measured_date = Column(DateTime, nullable=False)
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="health_records")
@@ -146,6 +211,10 @@ class HealthRecord(Base):
 class DocumentAnalysis(Base):
     """Document analysis results and metadata"""
     __tablename__ = 'document_analyses'
+    __table_args__ = (
+        Index('ix_document_analyses_user_created', 'user_id', 'created_at'),
+        Index('ix_document_analyses_user_type', 'user_id', 'document_type'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -159,43 +228,51 @@ class DocumentAnalysis(Base):
     # Processing metadata
     processing_method = Column(String(50))  # tesseract, easyocr, pdfplumber, etc.
     processing_duration = Column(Float)  # seconds
-    processed_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, server_default=func.now())
     
-    # Content
-    text_content = Column(Text)
-    extracted_data = Column(Text)  # JSON string of structured data
+    # Content. The large columns are in the 'content' group, which is only loaded
+    # when accessed or undeferred, so listings read just the metadata.
+    text_content = deferred(Column(Text), group='content')
+    extracted_data = deferred(Column(JSON(none_as_null=True)), group='content')  # structured data
     
     # AI Analysis
-    llm_analysis = Column(Text)  # Full AI analysis text
-    key_findings = Column(Text)  # JSON string of key findings
-    recommendations = Column(Text)  # JSON string of recommendations
-    medical_terms = Column(Text)  # JSON string of explained medical terms
+    llm_analysis = deferred(Column(Text), group='content')  # Full AI analysis text
+    key_findings = deferred(Column(JSON(none_as_null=True)), group='content')  # list of key findings
+    recommendations = deferred(Column(JSON(none_as_null=True)), group='content')  # recommendations
+    medical_terms = deferred(Column(JSON(none_as_null=True)), group='content')  # explained medical terms
     
     # Status and flags
-    analysis_status = Column(String(20), default='completed')  # processing, completed, failed
+    analysis_status = Column(IntEnumColumn(AnalysisStatus), default=AnalysisStatus.COMPLETED)
     is_critical = Column(Boolean, default=False)
     is_favorite = Column(Boolean, default=False)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
     user = relationship("User", back_populates="document_analyses")
+    tags = relationship("DocumentTag", back_populates="document")
+    extracted_medications = relationship("ExtractedMedication", back_populates="document")
+    extracted_lab_values = relationship("ExtractedLabValue", back_populates="document")
+    summary = relationship("DocumentSummary", back_populates="document", uselist=False)
 
 
 class DocumentTag(Base):
     """Tags for document categorization"""
     __tablename__ = 'document_tags'
+    __table_args__ = (
+        Index('ix_document_tags_document_name', 'document_id', 'tag_name'),
+    )
     
     id = Column(Integer, primary_key=True)
     document_id = Column(Integer, ForeignKey('document_analyses.id'), nullable=False)
     tag_name = Column(String(50), nullable=False)
-    tag_type = Column(String(20), default='user')  # user, system, ai
-    created_at = Column(DateTime, default=datetime.utcnow)
+    tag_type = Column(IntEnumColumn(TagType), default=TagType.USER)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    document = relationship("DocumentAnalysis")
+    document = relationship("DocumentAnalysis", back_populates="tags")
 
 
 class ExtractedMedication(Base):
@@ -203,7 +280,7 @@ class ExtractedMedication(Base):
     __tablename__ = 'extracted_medications'
     
     id = Column(Integer, primary_key=True)
-    document_id = Column(Integer, ForeignKey('document_analyses.id'), nullable=False)
+    document_id = Column(Integer, ForeignKey('document_analyses.id'), nullable=False, index=True)
     medication_name = Column(String(100), nullable=False)
     dosage = Column(String(50))
     frequency = Column(String(50))
@@ -215,10 +292,10 @@ class ExtractedMedication(Base):
     is_verified = Column(Boolean, default=False)
     is_added_to_profile = Column(Boolean, default=False)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    document = relationship("DocumentAnalysis")
+    document = relationship("DocumentAnalysis", back_populates="extracted_medications")
 
 
 class ExtractedLabValue(Base):
@@ -226,7 +303,7 @@ class ExtractedLabValue(Base):
     __tablename__ = 'extracted_lab_values'
     
     id = Column(Integer, primary_key=True)
-    document_id = Column(Integer, ForeignKey('document_analyses.id'), nullable=False)
+    document_id = Column(Integer, ForeignKey('document_analyses.id'), nullable=False, index=True)
     test_name = Column(String(100), nullable=False)
     value = Column(String(50))
     unit = Column(String(20))
@@ -238,10 +315,10 @@ class ExtractedLabValue(Base):
     # Clinical context
     clinical_significance = Column(Text)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    document = relationship("DocumentAnalysis")
+    document = relationship("DocumentAnalysis", back_populates="extracted_lab_values")
 
 
 class DocumentSummary(Base):
@@ -254,23 +331,23 @@ class DocumentSummary(Base):
     # Summary content
     short_summary = Column(Text)  # 2-3 sentences
     detailed_summary = Column(Text)  # comprehensive summary
-    key_points = Column(Text)  # JSON array of key points
-    action_items = Column(Text)  # JSON array of action items
+    key_points = Column(JSON(none_as_null=True))  # list of key points
+    action_items = Column(JSON(none_as_null=True))  # list of action items
     
     # Analysis metadata
     summary_type = Column(String(50))  # ai_generated, manual, hybrid
     model_used = Column(String(50))  # gpt-3.5-turbo, local_model, etc.
-    generation_date = Column(DateTime, default=datetime.utcnow)
+    generation_date = Column(DateTime, server_default=func.now())
     
     # Quality metrics
     readability_score = Column(Float)
     accuracy_score = Column(Float)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
     
     # Relationships
-    document = relationship("DocumentAnalysis", uselist=False)
+    document = relationship("DocumentAnalysis", back_populates="summary")
 
 
 class Settings(Base):
@@ -281,5 +358,5 @@ class Settings(Base):
     key = Column(String(100), unique=True, nullable=False)
     value = Column(Text)
     description = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())
\ No newline at end of file
@@ -3,17 +3,154 @@ Database service for managing data operations
 """
 
 import sqlite3
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+import threading
+from collections import Counter
+from sqlalchemy import create_engine, event, insert, inspect, select, text, DateTime, Float, Integer
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import raiseload, scoped_session, sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import json
 import os
 
-from src.models.database_models import Base, User, Medication, MedicationLog, MedicalReport, Appointment, HealthRecord, Settings
+from src.models.database_models import Base, User, Medication, MedicationLog, MedicalReport, Appointment, AppointmentStatus, HealthRecord, Settings, IntEnumColumn
 from src.utils.config import Config
 
+# orjson serializes the stored analyses several times faster than the standard library
+try:
+    import orjson
+
+    def json_dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    json_loads = json.loads
+
+# Full-text index over the searchable document columns. The trigram tokenizer
+# matches any substring of three or more characters, like the LIKE search it replaces.
+DOCUMENT_SEARCH_TABLE = 'document_analyses_fts'
+DOCUMENT_SEARCH_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {DOCUMENT_SEARCH_TABLE} USING fts5(
+        file_name, text_content, llm_analysis,
+        content='document_analyses', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {DOCUMENT_SEARCH_TABLE}_insert AFTER INSERT ON document_analyses BEGIN
+        INSERT INTO {DOCUMENT_SEARCH_TABLE} (rowid, file_name, text_content, llm_analysis)
+        VALUES (new.id, new.file_name, new.text_content, new.llm_analysis);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {DOCUMENT_SEARCH_TABLE}_delete AFTER DELETE ON document_analyses BEGIN
+        INSERT INTO {DOCUMENT_SEARCH_TABLE} ({DOCUMENT_SEARCH_TABLE}, rowid, file_name, text_content, llm_analysis)
+        VALUES ('delete', old.id, old.file_name, old.text_content, old.llm_analysis);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {DOCUMENT_SEARCH_TABLE}_update
+    AFTER UPDATE OF file_name, text_content, llm_analysis ON document_analyses BEGIN
+        INSERT INTO {DOCUMENT_SEARCH_TABLE} ({DOCUMENT_SEARCH_TABLE}, rowid, file_name, text_content, llm_analysis)
+        VALUES ('delete', old.id, old.file_name, old.text_content, old.llm_analysis);
+        INSERT INTO {DOCUMENT_SEARCH_TABLE} (rowid, file_name, text_content, llm_analysis)
+        VALUES (new.id, new.file_name, new.text_content, new.llm_analysis);
+    END""",
+]
+# Shortest term the trigram index can match
+DOCUMENT_SEARCH_MIN_TERM_LENGTH = 3
+# bm25() weights for file_name, text_content and llm_analysis; a match in the
+# file name counts most, as it did in the previous relevance scoring
+DOCUMENT_SEARCH_WEIGHTS = (10.0, 1.0, 2.0)
+
+# Timestamps are stamped by SQLite. Databases created before the columns had
+# server defaults get them from the insert trigger instead.
+TIMESTAMP_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS {table}_stamp_insert
+    AFTER INSERT ON {table} FOR EACH ROW WHEN {missing} BEGIN
+        UPDATE {table} SET {assignments} WHERE rowid = NEW.rowid;
+    END"""
+TIMESTAMP_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS {table}_stamp_update
+    AFTER UPDATE ON {table} FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN
+        UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+    END"""
+
+# Write-ahead logging lets reads proceed during writes, and NORMAL sync only
+# fsyncs at checkpoints instead of on every commit. A writer that finds the
+# database locked waits up to 30 seconds instead of failing, temporary tables
+# and sort spills stay in memory, and each connection caches up to 20 MB of pages.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+)
+
+# Pooled connections are shared by the UI thread and the document analysis
+# workers, so SQLite must allow them to move between threads. Connections stay
+# open between calls; bursts beyond the pool get short-lived overflow connections.
+DATABASE_POOL_SIZE = 4
+DATABASE_MAX_OVERFLOW = 8
+
+
+# Number of ORM writes seen per table. Screens compare these to skip reloading
+# data that has not changed since they last showed it.
+_data_versions = Counter()
+_data_versions_lock = threading.Lock()
+
+
+def data_version(*table_names: str) -> int:
+    """Get a number that increases whenever any of the given tables is written"""
+    with _data_versions_lock:
+        return sum(_data_versions[name] for name in table_names)
+
+
+def _count_writes(table_names) -> None:
+    with _data_versions_lock:
+        _data_versions.update(table_names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_writes(session, flush_context):
+    """Count objects written by a unit-of-work flush"""
+    _count_writes({obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stamped_updates(session, flush_context):
+    """Note updated rows whose updated_at the update trigger is about to change"""
+    session.info.setdefault('stamped_updates', []).extend(
+        obj for obj in session.dirty if 'updated_at' in obj.__table__.c and session.is_modified(obj)
+    )
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _load_stamped_updates(session, flush_context):
+    """
+    Reload updated_at for rows the flush updated
+
+    The flush expires it, since SQLite sets it; without reloading it here, reading
+    it from the row after the session closes would fail.
+    """
+    for obj in session.info.pop('stamped_updates', ()):
+        if obj in session and 'updated_at' in inspect(obj).expired_attributes:
+            session.refresh(obj, ['updated_at'])
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _count_statement_writes(orm_execute_state):
+    """Count ORM-enabled INSERT, UPDATE and DELETE statements, such as bulk inserts"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _count_writes({mapper.local_table.name})
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure each new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
 
 class DatabaseService:
     """Service for database operations"""
@@ -22,20 +159,42 @@ class DatabaseService:
         self.config = Config()
         self.engine = None
         self.SessionLocal = None
+        self.full_text_search = False
+        # Setting values by key, including None for missing keys. All setting
+        # writes go through update_setting, which keeps this current.
+        self._settings_cache: Dict[str, Optional[str]] = {}
+        self._settings_lock = threading.Lock()
         
     def initialize_database(self):
         """Initialize database connection and create tables"""
         try:
             # Create SQLAlchemy engine
             database_url = f"sqlite:///{self.config.database_path}"
-            self.engine = create_engine(database_url, echo=False)
+            self.engine = create_engine(database_url, echo=False, poolclass=QueuePool,
+                                        pool_size=DATABASE_POOL_SIZE,
+                                        max_overflow=DATABASE_MAX_OVERFLOW,
+                                        connect_args={'check_same_thread': False},
+                                        json_serializer=json_dumps, json_deserializer=json_loads)
+            event.listen(self.engine, 'connect', _apply_sqlite_pragmas)
             
-            # Create session factory
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            # Create session factory. Each thread reuses one session, and objects
+            # stay loaded after commit so returned rows can be read without a new query.
+            self.SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False,
+                                                            expire_on_commit=False, bind=self.engine))
             
             # Create all tables
             Base.metadata.create_all(bind=self.engine)
-            
+
+            # create_all skips indexes on tables that already exist, so databases
+            # created before an index was added get it here
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=self.engine, checkfirst=True)
+
+            self._convert_enum_columns()
+            self._create_timestamp_triggers()
+            self._create_document_search_index()
+
             print(f"Database initialized at: {self.config.database_path}")
             
             # Initialize default settings
@@ -45,6 +204,72 @@ class DatabaseService:
             print(f"Error initializing database: {e}")
             raise
     
+    def _convert_enum_columns(self):
+        """Replace the status names stored by older databases with their enum values"""
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                for column in table.columns:
+                    if not isinstance(column.type, IntEnumColumn):
+                        continue
+                    
+                    members = list(column.type.enum_class)
+                    names = {f"name_{member.value}": member.name.lower() for member in members}
+                    cases = " ".join(f"WHEN :name_{member.value} THEN {member.value}" for member in members)
+                    connection.execute(text(
+                        f"UPDATE {table.name} SET {column.name} = CASE {column.name} {cases} END "
+                        f"WHERE {column.name} IN ({', '.join(':' + key for key in names)})"
+                    ), names)
+    
+    def _create_timestamp_triggers(self):
+        """Create the triggers that stamp created/updated timestamps"""
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                stamped = [column.name for column in table.columns
+                           if isinstance(column.type, DateTime) and column.server_default is not None]
+                if not stamped:
+                    continue
+                
+                connection.execute(text(TIMESTAMP_INSERT_TRIGGER.format(
+                    table=table.name,
+                    missing=" OR ".join(f"NEW.{name} IS NULL" for name in stamped),
+                    assignments=", ".join(f"{name} = COALESCE({name}, CURRENT_TIMESTAMP)" for name in stamped)
+                )))
+                if 'updated_at' in stamped:
+                    connection.execute(text(TIMESTAMP_UPDATE_TRIGGER.format(table=table.name)))
+    
+    def _create_document_search_index(self):
+        """Create the full-text document index, filling it from existing documents"""
+        try:
+            with self.engine.begin() as connection:
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                    {"name": DOCUMENT_SEARCH_TABLE}
+                ).first()
+                for statement in DOCUMENT_SEARCH_SCHEMA:
+                    connection.execute(text(statement))
+                if not exists:
+                    connection.execute(text(
+                        f"INSERT INTO {DOCUMENT_SEARCH_TABLE} ({DOCUMENT_SEARCH_TABLE}) VALUES ('rebuild')"
+                    ))
+            self.full_text_search = True
+        except OperationalError as e:
+            # SQLite built without FTS5 or the trigram tokenizer; searches use LIKE
+            print(f"Full-text document search unavailable: {e}")
+            self.full_text_search = False
+    
+    def match_documents(self, terms: List[str]):
+        """
+        Select the ids of documents containing every term, using the full-text index
+        
+        Each id comes with its bm25 rank, which is lower for better matches.
+        """
+        match = " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        weights = ", ".join(str(weight) for weight in DOCUMENT_SEARCH_WEIGHTS)
+        return text(
+            f"SELECT rowid, bm25({DOCUMENT_SEARCH_TABLE}, {weights}) AS rank "
+            f"FROM {DOCUMENT_SEARCH_TABLE} WHERE {DOCUMENT_SEARCH_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(rowid=Integer, rank=Float)
+    
     @contextmanager
     def get_session(self):
         """Get database session with automatic cleanup"""
@@ -70,11 +295,16 @@ class DatabaseService:
         ]
         
         with self.get_session() as session:
-            for key, value, description in default_settings:
-                existing = session.query(Settings).filter_by(key=key).first()
-                if not existing:
-                    setting = Settings(key=key, value=value, description=description)
-                    session.add(setting)
+            existing_keys = set(session.scalars(
+                select(Settings.key).where(Settings.key.in_([key for key, _, _ in default_settings]))
+            ))
+            missing = [{'key': key, 'value': value, 'description': description}
+                       for key, value, description in default_settings if key not in existing_keys]
+            if missing:
+                session.execute(insert(Settings), missing)
+    
+    # Creates flush to assign the id; SQLAlchemy reads server defaults such as
+    # created_at back through INSERT ... RETURNING, so no refresh is needed.
     
     # User operations
     def create_user(self, user_data: Dict[str, Any]) -> User:
@@ -83,7 +313,6 @@ class DatabaseService:
             user = User(**user_data)
             session.add(user)
             session.flush()
-            session.refresh(user)
             return user
     
     def get_user(self, user_id: int) -> Optional[User]:
@@ -98,7 +327,6 @@ class DatabaseService:
             if user:
                 for key, value in user_data.items():
                     setattr(user, key, value)
-                user.updated_at = datetime.utcnow()
                 session.flush()
                 session.refresh(user)
                 return user
@@ -111,13 +339,15 @@ class DatabaseService:
             medication = Medication(**medication_data)
             session.add(medication)
             session.flush()
-            session.refresh(medication)
             return medication
     
+    # Listings return rows only; no screen reads their relationships, so loading
+    # them would be wasted work. raiseload makes any relationship access fail
+    # loudly instead of issuing one lazy SELECT per row.
     def get_active_medications(self, user_id: int) -> List[Medication]:
         """Get all active medications for a user"""
         with self.get_session() as session:
-            return session.query(Medication).filter_by(
+            return session.query(Medication).options(raiseload('*')).filter_by(
                 user_id=user_id, 
                 is_active=True
             ).all()
@@ -129,7 +359,6 @@ class DatabaseService:
             if medication:
                 for key, value in medication_data.items():
                     setattr(medication, key, value)
-                medication.updated_at = datetime.utcnow()
                 session.flush()
                 session.refresh(medication)
                 return medication
@@ -141,9 +370,15 @@ class DatabaseService:
             log = MedicationLog(**log_data)
             session.add(log)
             session.flush()
-            session.refresh(log)
             return log
     
+    def bulk_log_medication_intake(self, logs: List[Dict[str, Any]]) -> None:
+        """Log several medication intakes in one transaction"""
+        if not logs:
+            return
+        with self.get_session() as session:
+            session.execute(insert(MedicationLog), logs)
+    
     # Medical report operations
     def add_medical_report(self, report_data: Dict[str, Any]) -> MedicalReport:
         """Add a new medical report"""
@@ -151,13 +386,19 @@ class DatabaseService:
             report = MedicalReport(**report_data)
             session.add(report)
             session.flush()
-            session.refresh(report)
             return report
     
+    def bulk_add_medical_reports(self, reports: List[Dict[str, Any]]) -> None:
+        """Add several medical reports in one transaction"""
+        if not reports:
+            return
+        with self.get_session() as session:
+            session.execute(insert(MedicalReport), reports)
+    
     def get_medical_reports(self, user_id: int, category: Optional[str] = None) -> List[MedicalReport]:
         """Get medical reports for a user"""
         with self.get_session() as session:
-            query = session.query(MedicalReport).filter_by(user_id=user_id)
+            query = session.query(MedicalReport).options(raiseload('*')).filter_by(user_id=user_id)
             if category:
                 query = query.filter_by(category=category)
             return query.order_by(MedicalReport.report_date.desc()).all()
@@ -169,16 +410,15 @@ class DatabaseService:
             appointment = Appointment(**appointment_data)
             session.add(appointment)
             session.flush()
-            session.refresh(appointment)
             return appointment
     
     def get_upcoming_appointments(self, user_id: int) -> List[Appointment]:
         """Get upcoming appointments for a user"""
         with self.get_session() as session:
-            return session.query(Appointment).filter(
+            return session.query(Appointment).options(raiseload('*')).filter(
                 Appointment.user_id == user_id,
                 Appointment.appointment_date >= datetime.utcnow(),
-                Appointment.status == 'scheduled'
+                Appointment.status == AppointmentStatus.SCHEDULED
             ).order_by(Appointment.appointment_date).all()
     
     # Health record operations
@@ -188,13 +428,12 @@ class DatabaseService:
             record = HealthRecord(**record_data)
             session.add(record)
             session.flush()
-            session.refresh(record)
             return record
     
     def get_health_records(self, user_id: int, record_type: Optional[str] = None) -> List[HealthRecord]:
         """Get health records for a user"""
         with self.get_session() as session:
-            query = session.query(HealthRecord).filter_by(user_id=user_id)
+            query = session.query(HealthRecord).options(raiseload('*')).filter_by(user_id=user_id)
             if record_type:
                 query = query.filter_by(record_type=record_type)
             return query.order_by(HealthRecord.measured_date.desc()).all()
@@ -202,9 +441,16 @@ class DatabaseService:
     # Settings operations
     def get_setting(self, key: str) -> Optional[str]:
         """Get a setting value"""
+        with self._settings_lock:
+            if key in self._settings_cache:
+                return self._settings_cache[key]
+        
         with self.get_session() as session:
             setting = session.query(Settings).filter_by(key=key).first()
-            return setting.value if setting else None
+            value = setting.value if setting else None
+        
+        with self._settings_lock:
+            return self._settings_cache.setdefault(key, value)
     
     def update_setting(self, key: str, value: str) -> None:
         """Update a setting value"""
@@ -212,13 +458,24 @@ class DatabaseService:
             setting = session.query(Settings).filter_by(key=key).first()
             if setting:
                 setting.value = value
-                setting.updated_at = datetime.utcnow()
             else:
                 setting = Settings(key=key, value=value)
                 session.add(setting)
+        
+        with self._settings_lock:
+            self._settings_cache[key] = value
+    
+    def release_sessions(self):
+        """Discard the current thread's session"""
+        if self.SessionLocal:
+            self.SessionLocal.remove()
     
     def close_connection(self):
         """Close database connection"""
+        self.release_sessions()
         if self.engine:
+            # Refresh the query planner's statistics for tables that need it
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('PRAGMA optimize')
             self.engine.dispose()
             print("Database connection closed.")
\ No newline at end of file
@@ -6,9 +6,12 @@ Handles various document types: PDF, DOCX, images, medical reports, ECG data
 import os
 import io
 import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
+from functools import lru_cache
 import logging
 
 # Core document processing
@@ -38,6 +41,79 @@ except ImportError:
 
 from src.utils.config import Config
 
+# OCR text read with lower confidence than this is dropped
+OCR_MIN_CONFIDENCE = 0.5
+# Images whose estimated noise is below this are not denoised before OCR
+OCR_DENOISE_MIN_NOISE = 2.0
+# Larger images are scaled down to this many pixels on their longest side
+# before OCR, about 300 DPI for a letter-size page
+OCR_MAX_DIMENSION = 2000
+# Images are scaled down to this many pixels on their longest side to look for chart lines
+CHART_DETECTION_MAX_DIMENSION = 1024
+
+# PDFs with at least this many pages have their text extracted by a shared
+# process pool, each worker taking a contiguous run of pages. Smaller files
+# are read in-process, since each worker has to open and parse the file again.
+PARALLEL_PDF_MIN_PAGES = 8
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+_PDF_POOL_LOCK = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the shared PDF extraction process pool, starting it on first use"""
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            _PDF_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return _PDF_POOL
+
+
+def _extract_page_texts(pages) -> List[str]:
+    """Extract the non-empty text of each pdfplumber page"""
+    text_parts = []
+    for page in pages:
+        text = page.extract_text()
+        # Pages keep their parsed layout objects until closed, which
+        # for long reports would otherwise hold every page in memory
+        page.close()
+        if text:
+            text_parts.append(text)
+    return text_parts
+
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF; runs in a worker process"""
+    with pdfplumber.open(file_path) as pdf:
+        return _extract_page_texts(pdf.pages[start:stop])
+
+
+def _extract_pdf_text_parallel(file_path: str, page_count: int) -> List[str]:
+    """Extract page texts in order, splitting the pages across the process pool"""
+    pool = _get_pdf_pool()
+    run_length = -(-page_count // (os.cpu_count() or 1))
+    futures = [pool.submit(_extract_pdf_page_range, file_path, start, min(start + run_length, page_count))
+               for start in range(0, page_count, run_length)]
+    return [text for future in futures for text in future.result()]
+
+
+@lru_cache(maxsize=1)
+def _get_ocr_reader():
+    """
+    EasyOCR reader shared by every service, loaded on the first image processed
+    
+    Loading reads the recognition model into memory, so apps that only handle
+    PDFs and Word documents never pay for it. Returns None if EasyOCR is unavailable.
+    """
+    if not ADVANCED_PROCESSING:
+        return None
+    try:
+        reader = easyocr.Reader(['en'])
+        logging.info("EasyOCR initialized successfully")
+        return reader
+    except Exception as e:
+        logging.warning(f"Advanced OCR not available: {e}")
+        return None
+
 
 class DocumentProcessingService:
     """Service for processing various document types and extracting text/data"""
@@ -51,10 +127,10 @@ class DocumentProcessingService:
             'image': ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'],
             'medical': ['.dcm', '.dicom']  # Medical imaging formats
         }
-        
-        # Initialize OCR readers
-        self.ocr_reader = None
-        self.setup_ocr()
+        # Every supported extension, for membership tests
+        self.supported_extensions = frozenset(
+            extension for extensions in self.supported_formats.values() for extension in extensions
+        )
         
         # Medical document patterns
         self.medical_patterns = {
@@ -64,15 +140,19 @@ class DocumentProcessingService:
             'radiology': ['x-ray', 'ct scan', 'mri', 'ultrasound', 'radiology'],
             'lab_report': ['laboratory', 'lab results', 'reference range', 'normal']
         }
-    
-    def setup_ocr(self):
-        """Initialize OCR engines"""
-        try:
-            if ADVANCED_PROCESSING:
-                self.ocr_reader = easyocr.Reader(['en'])
-                logging.info("EasyOCR initialized successfully")
-        except Exception as e:
-            logging.warning(f"Advanced OCR not available: {e}")
+        # Fallback types, in priority order, for text matching no medical pattern
+        self.generic_patterns = {
+            'medical_document': ['patient', 'medical', 'doctor', 'hospital'],
+            'report': ['report', 'analysis', 'findings']
+        }
+        
+        # The patterns as (document type, lowercased keyword) pairs, matched
+        # against lowercased text by classify_document_type
+        self.keyword_patterns = tuple(
+            (doc_type, keyword.lower())
+            for doc_type, keywords in self.medical_patterns.items()
+            for keyword in keywords
+        )
     
     def process_document(self, file_path: str) -> Dict[str, Any]:
         """
@@ -87,12 +167,13 @@ class DocumentProcessingService:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        file_extension = Path(file_path).suffix.lower()
+        path = Path(file_path)
+        file_extension = path.suffix.lower()
         file_size = os.path.getsize(file_path)
         
         result = {
             'file_path': file_path,
-            'file_name': Path(file_path).name,
+            'file_name': path.name,
             'file_extension': file_extension,
             'file_size_bytes': file_size,
             'processed_at': datetime.now().isoformat(),
@@ -147,11 +228,15 @@ class DocumentProcessingService:
             # Try advanced PDF processing first
             if ADVANCED_PROCESSING:
                 with pdfplumber.open(file_path) as pdf:
-                    text_parts = []
-                    for page_num, page in enumerate(pdf.pages):
-                        text = page.extract_text()
-                        if text:
-                            text_parts.append(text)
+                    text_parts = None
+                    if len(pdf.pages) >= PARALLEL_PDF_MIN_PAGES and (os.cpu_count() or 1) > 1:
+                        try:
+                            text_parts = _extract_pdf_text_parallel(file_path, len(pdf.pages))
+                        except Exception as e:
+                            # Process pools are unavailable on some platforms
+                            logging.warning(f"Parallel PDF extraction failed, running serially: {e}")
+                    if text_parts is None:
+                        text_parts = _extract_page_texts(pdf.pages)
                     
                     result['text_content'] = '\n\n'.join(text_parts)
                     result['metadata'] = {
@@ -222,7 +307,7 @@ class DocumentProcessingService:
                 content = file.read()
                 result['text_content'] = content
                 result['metadata'] = {
-                    'lines': len(content.split('\n')),
+                    'lines': content.count('\n') + 1,
                     'characters': len(content),
                     'method': 'direct_read'
                 }
@@ -253,17 +338,27 @@ class DocumentProcessingService:
                 'channels': image.shape[2] if len(image.shape) > 2 else 1
             }
             
-            # Preprocess image for better OCR
-            processed_image = self.preprocess_image_for_ocr(image)
+            # Preprocessing and OCR cost grows with pixel count, while accuracy
+            # stops improving well below camera resolution
+            if max(height, width) > OCR_MAX_DIMENSION:
+                scale = OCR_MAX_DIMENSION / max(height, width)
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                result['metadata']['ocr_scale'] = scale
+            
+            # Preprocess image for better OCR. The grayscale copy is made once and
+            # shared with chart detection below.
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image
+            processed_image = self.preprocess_image_for_ocr(gray)
             
             # Try advanced OCR first
-            if self.ocr_reader and ADVANCED_PROCESSING:
+            ocr_reader = _get_ocr_reader()
+            if ocr_reader:
                 try:
-                    ocr_results = self.ocr_reader.readtext(processed_image)
-                    text_parts = [result[1] for result in ocr_results if result[2] > 0.5]
-                    result['text_content'] = ' '.join(text_parts)
+                    ocr_results = ocr_reader.readtext(processed_image)
+                    text, confidence = self.summarize_ocr_results(ocr_results)
+                    result['text_content'] = text
                     result['metadata']['method'] = 'easyocr'
-                    result['metadata']['confidence'] = sum(r[2] for r in ocr_results) / len(ocr_results) if ocr_results else 0
+                    result['metadata']['confidence'] = confidence
                 except Exception:
                     pass
             
@@ -283,7 +378,7 @@ class DocumentProcessingService:
                     logging.warning(f"Tesseract OCR failed: {e}")
             
             # If this looks like a medical chart/ECG, try specialized processing
-            if self.is_medical_chart(image):
+            if self.is_medical_chart(gray):
                 medical_data = self.extract_medical_chart_data(image)
                 result['metadata']['medical_chart_data'] = medical_data
                 
@@ -292,6 +387,24 @@ class DocumentProcessingService:
         
         return result
     
+    @staticmethod
+    def summarize_ocr_results(ocr_results: List[Tuple[Any, str, float]]) -> Tuple[str, float]:
+        """
+        Join the confidently read text and average the confidence in one pass
+        
+        Each OCR result is a (bounding box, text, confidence) tuple; text below
+        OCR_MIN_CONFIDENCE is left out but still counts toward the average.
+        """
+        text_parts = []
+        total_confidence = 0.0
+        for _, text, confidence in ocr_results:
+            total_confidence += confidence
+            if confidence > OCR_MIN_CONFIDENCE:
+                text_parts.append(text)
+        
+        average = total_confidence / len(ocr_results) if ocr_results else 0
+        return ' '.join(text_parts), average
+    
     def preprocess_image_for_ocr(self, image):
         """Preprocess image to improve OCR accuracy"""
         if not PDF_AVAILABLE:
@@ -303,17 +416,30 @@ class DocumentProcessingService:
         else:
             gray = image
         
-        # Apply denoising
-        denoised = cv2.fastNlMeansDenoising(gray)
+        # Apply denoising, the slowest step, only to images that show noise
+        if self.estimate_image_noise(gray) >= OCR_DENOISE_MIN_NOISE:
+            gray = cv2.fastNlMeansDenoising(gray)
         
         # Enhance contrast
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced = clahe.apply(denoised)
+        enhanced = clahe.apply(gray)
         
-        # Apply threshold for better text recognition
-        _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Apply threshold for better text recognition, reusing the enhanced buffer
+        cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=enhanced)
         
-        return binary
+        return enhanced
+    
+    @staticmethod
+    def estimate_image_noise(gray) -> float:
+        """
+        Estimate pixel noise as the median absolute Laplacian
+        
+        Text edges cover a small share of a document image, so the median
+        reflects the background: 0 for clean renders, about 3 per unit of
+        Gaussian noise standard deviation for scans.
+        """
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+        return float(np.median(np.abs(laplacian)))
     
     def is_medical_chart(self, image) -> bool:
         """Detect if image contains medical charts/graphs"""
@@ -323,9 +449,18 @@ class DocumentProcessingService:
         # Simple heuristic: look for grid patterns and regular waves
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image
         
+        # Line detection cost grows with edge pixels, so large images are scaled
+        # down first; the vote threshold scales with line length to match
+        threshold = 100
+        height, width = gray.shape[:2]
+        if max(height, width) > CHART_DETECTION_MAX_DIMENSION:
+            scale = CHART_DETECTION_MAX_DIMENSION / max(height, width)
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            threshold = max(int(threshold * scale), 1)
+        
         # Detect lines (common in medical charts)
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
+        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=threshold)
         
         return lines is not None and len(lines) > 10
     
@@ -343,23 +478,21 @@ class DocumentProcessingService:
         """Classify document type based on text content"""
         text_lower = text.lower()
         
-        # Count matches for each medical document type
+        # Count matches for each medical document type. Each keyword is one C-level
+        # substring search, which measured faster than a combined regex alternation.
         type_scores = {}
-        for doc_type, keywords in self.medical_patterns.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            if score > 0:
-                type_scores[doc_type] = score
+        for doc_type, keyword in self.keyword_patterns:
+            if keyword in text_lower:
+                type_scores[doc_type] = type_scores.get(doc_type, 0) + 1
         
         if type_scores:
             return max(type_scores, key=type_scores.get)
         
-        # Generic classification
-        if any(word in text_lower for word in ['patient', 'medical', 'doctor', 'hospital']):
-            return 'medical_document'
-        elif any(word in text_lower for word in ['report', 'analysis', 'findings']):
-            return 'report'
-        else:
-            return 'general_document'
+        # Generic classification, only scanned when no medical pattern matched
+        for doc_type, keywords in self.generic_patterns.items():
+            if any(keyword in text_lower for keyword in keywords):
+                return doc_type
+        return 'general_document'
     
     def calculate_confidence_score(self, result: Dict[str, Any]) -> float:
         """Calculate confidence score for the document processing"""
@@ -399,7 +532,7 @@ class DocumentProcessingService:
             return False, "File does not exist"
         
         file_extension = Path(file_path).suffix.lower()
-        if file_extension not in self.get_supported_formats():
+        if file_extension not in self.supported_extensions:
             return False, f"Unsupported file format: {file_extension}"
         
         file_size = os.path.getsize(file_path)
@@ -4,20 +4,43 @@ Coordinates document processing, LLM analysis, and database storage
 """
 
 import os
-import json
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
 
-from src.services.database_service import DatabaseService
+from sqlalchemy import exists, func, insert, literal, select
+from sqlalchemy.orm import joinedload, selectinload, undefer, undefer_group
+
+from src.services.database_service import DatabaseService, DOCUMENT_SEARCH_MIN_TERM_LENGTH, json_dumps, json_loads
 from src.services.document_processing_service import DocumentProcessingService
-from llm.health_llm_service import HealthLLMService
+from llm.health_llm_service import get_health_llm_service
 from src.models.database_models import (
     DocumentAnalysis, DocumentTag, ExtractedMedication, 
-    ExtractedLabValue, DocumentSummary
+    ExtractedLabValue, DocumentSummary, AnalysisStatus, TagType
 )
 
+# Number of document detail views kept in memory
+DOCUMENT_DETAILS_CACHE_SIZE = 32
+
+# Documents extracted and analyzed at once by analyze_documents_batch
+BATCH_ANALYSIS_WORKERS = 3
+
+# System tags added to a stored document, by document type
+_SYSTEM_TAGS = MappingProxyType({
+    'ecg': ('cardiology', 'heart', 'diagnostic'),
+    'blood_test': ('laboratory', 'blood', 'test_results'),
+    'prescription': ('medication', 'pharmacy', 'treatment'),
+    'radiology': ('imaging', 'diagnostic', 'radiology'),
+    'lab_report': ('laboratory', 'test_results', 'clinical'),
+    'medical_document': ('medical', 'healthcare', 'clinical'),
+})
+_DEFAULT_SYSTEM_TAGS = ('medical', 'document')
+
 
 class DocumentService:
     """
@@ -25,14 +48,16 @@ class DocumentService:
     Orchestrates document processing, AI analysis, and data storage
     """
     
-    def __init__(self):
-        self.db_service = DatabaseService()
+    def __init__(self, db_service: Optional[DatabaseService] = None):
+        # Share the app's initialized database service, and with it its connection pool
+        self.db_service = db_service or DatabaseService()
         self.doc_processor = DocumentProcessingService()
-        self.llm_service = HealthLLMService()
+        self.llm_service = get_health_llm_service()
         self.logger = logging.getLogger(__name__)
         
-        # Configure logging
-        logging.basicConfig(level=logging.INFO)
+        # Most recently viewed document details, keyed by (document_id, user_id)
+        self._details_cache: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+        self._details_lock = threading.Lock()
     
     def analyze_document_complete(self, file_path: str, user_id: int = 1) -> Dict[str, Any]:
         """
@@ -42,6 +67,23 @@ class DocumentService:
         3. Store results in database
         4. Return comprehensive results
         """
+        return self._store_analysis(self._process_and_analyze(file_path), user_id)
+    
+    def analyze_documents_batch(self, file_paths: List[str], user_id: int = 1) -> List[Dict[str, Any]]:
+        """
+        Analyze several documents, returning their results in the order given
+        
+        Documents are extracted and analyzed on a small thread pool, so one document's
+        AI analysis overlaps the next one's text extraction. The calling thread stores
+        each finished document in turn, keeping a single database writer.
+        """
+        with ThreadPoolExecutor(max_workers=BATCH_ANALYSIS_WORKERS,
+                                thread_name_prefix='batch-analysis') as pool:
+            analyses = [pool.submit(self._process_and_analyze, file_path) for file_path in file_paths]
+            return [self._store_analysis(analysis.result(), user_id) for analysis in analyses]
+    
+    def _process_and_analyze(self, file_path: str) -> Dict[str, Any]:
+        """Extract a document's text and analyze it, without storing anything"""
         try:
             start_time = datetime.now()
             
@@ -60,25 +102,36 @@ class DocumentService:
             self.logger.info("Starting AI analysis...")
             llm_analysis = self.llm_service.analyze_document_comprehensive(processing_result)
             
-            # Step 3: Generate summary
-            summary = self.llm_service.generate_document_summary(processing_result)
+            # Step 3: Generate summary from the analysis just made
+            summary = self.llm_service.generate_document_summary(processing_result, llm_analysis)
+            
+            return {
+                "processing_result": processing_result,
+                "llm_analysis": llm_analysis,
+                "summary": summary,
+                "processing_duration": (datetime.now() - start_time).total_seconds()
+            }
             
-            # Step 4: Store in database
-            processing_duration = (datetime.now() - start_time).total_seconds()
+        except Exception as e:
+            self.logger.error(f"Document analysis failed: {e}")
+            return {"error": f"Analysis failed: {str(e)}", "success": False}
+    
+    def _store_analysis(self, analysis: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+        """Store an analysis from _process_and_analyze and build the response"""
+        if "error" in analysis:
+            return analysis
+        
+        try:
+            # Step 4: Store in database, along with the extracted structured data
             document_id = self._store_analysis_results(
-                processing_result, llm_analysis, summary, user_id, processing_duration
+                analysis["processing_result"], analysis["llm_analysis"], analysis["summary"],
+                user_id, analysis["processing_duration"]
             )
             
-            # Step 5: Extract and store structured data
-            self._extract_and_store_structured_data(document_id, processing_result, llm_analysis)
-            
-            # Step 6: Prepare comprehensive response
+            # Step 5: Prepare comprehensive response
             response = {
                 "document_id": document_id,
-                "processing_result": processing_result,
-                "llm_analysis": llm_analysis,
-                "summary": summary,
-                "processing_duration": processing_duration,
+                **analysis,
                 "success": True
             }
             
@@ -95,53 +148,54 @@ class DocumentService:
         """Store document analysis results in database"""
         try:
             with self.db_service.get_session() as session:
-                # Create main document analysis record
-                document_analysis = DocumentAnalysis(
-                    user_id=user_id,
-                    file_name=processing_result.get('file_name', ''),
-                    file_path=processing_result.get('file_path', ''),
-                    file_extension=processing_result.get('file_extension', ''),
-                    file_size_bytes=processing_result.get('file_size_bytes', 0),
-                    document_type=processing_result.get('document_type', 'unknown'),
-                    confidence_score=processing_result.get('confidence_score', 0.0),
-                    
-                    # Processing metadata
-                    processing_method=processing_result.get('metadata', {}).get('method', 'unknown'),
-                    processing_duration=processing_duration,
-                    
-                    # Content
-                    text_content=processing_result.get('text_content', ''),
-                    extracted_data=json.dumps(processing_result.get('metadata', {})),
-                    
-                    # AI Analysis
-                    llm_analysis=json.dumps(llm_analysis),
-                    key_findings=json.dumps(llm_analysis.get('key_findings', [])),
-                    recommendations=json.dumps(llm_analysis.get('recommendations', [])),
-                    medical_terms=json.dumps(llm_analysis.get('medical_terms', {})),
-                    
-                    analysis_status='completed'
-                )
-                
-                session.add(document_analysis)
-                session.flush()  # Get the ID
-                document_id = document_analysis.id
+                # Insert the main document analysis record, reading back its id
+                # from the same statement
+                document_id = session.execute(
+                    insert(DocumentAnalysis).values(
+                        user_id=user_id,
+                        file_name=processing_result.get('file_name', ''),
+                        file_path=processing_result.get('file_path', ''),
+                        file_extension=processing_result.get('file_extension', ''),
+                        file_size_bytes=processing_result.get('file_size_bytes', 0),
+                        document_type=processing_result.get('document_type', 'unknown'),
+                        confidence_score=processing_result.get('confidence_score', 0.0),
+                        
+                        # Processing metadata
+                        processing_method=processing_result.get('metadata', {}).get('method', 'unknown'),
+                        processing_duration=processing_duration,
+                        
+                        # Content
+                        text_content=processing_result.get('text_content', ''),
+                        extracted_data=processing_result.get('metadata', {}),
+                        
+                        # AI Analysis
+                        llm_analysis=json_dumps(llm_analysis),
+                        key_findings=llm_analysis.get('key_findings', []),
+                        recommendations=llm_analysis.get('recommendations', []),
+                        medical_terms=llm_analysis.get('medical_terms', {}),
+                        
+                        analysis_status=AnalysisStatus.COMPLETED
+                    ).returning(DocumentAnalysis.id)
+                ).scalar_one()
                 
                 # Create document summary
-                doc_summary = DocumentSummary(
+                session.execute(insert(DocumentSummary).values(
                     document_id=document_id,
                     short_summary=summary,
                     detailed_summary=llm_analysis.get('analysis', ''),
-                    key_points=json.dumps(llm_analysis.get('key_points', [])),
-                    action_items=json.dumps(llm_analysis.get('action_items', [])),
+                    key_points=llm_analysis.get('key_points', []),
+                    action_items=llm_analysis.get('action_items', []),
                     summary_type='ai_generated',
                     model_used='gpt-3.5-turbo' if llm_analysis else 'local_processing'
-                )
-                
-                session.add(doc_summary)
+                ))
                 
                 # Add system tags based on document type
                 self._add_system_tags(session, document_id, processing_result.get('document_type', 'unknown'))
                 
+                # Extracted medications and lab values go in the same transaction,
+                # so the whole analysis is stored with one commit
+                self._add_structured_data(session, document_id, llm_analysis)
+                
                 session.commit()
                 return document_id
                 
@@ -149,96 +203,82 @@ class DocumentService:
             self.logger.error(f"Failed to store analysis results: {e}")
             raise
     
-    def _extract_and_store_structured_data(self, document_id: int, 
-                                         processing_result: Dict[str, Any],
-                                         llm_analysis: Dict[str, Any]):
-        """Extract and store structured data (medications, lab values, etc.)"""
+    def _add_structured_data(self, session, document_id: int, llm_analysis: Dict[str, Any]):
+        """Add structured data (medications, lab values, etc.) extracted by the analysis"""
         try:
-            with self.db_service.get_session() as session:
-                # Extract medications if present
-                medications = llm_analysis.get('medications', [])
-                if isinstance(medications, dict):
-                    medications = medications.get('medications', [])
-                
-                for med_data in medications:
-                    if isinstance(med_data, dict):
-                        extracted_med = ExtractedMedication(
-                            document_id=document_id,
-                            medication_name=med_data.get('name', ''),
-                            dosage=med_data.get('dose', ''),
-                            frequency=med_data.get('frequency', ''),
-                            duration=med_data.get('duration', ''),
-                            instructions=med_data.get('instructions', ''),
-                            extracted_confidence=med_data.get('confidence', 0.8)
-                        )
-                        session.add(extracted_med)
-                
-                # Extract lab values if present
-                lab_values = llm_analysis.get('extracted_values', [])
-                if isinstance(lab_values, dict):
-                    lab_values = lab_values.get('values', [])
-                
-                for lab_data in lab_values:
-                    if isinstance(lab_data, dict):
-                        extracted_lab = ExtractedLabValue(
-                            document_id=document_id,
-                            test_name=lab_data.get('test', ''),
-                            value=str(lab_data.get('value', '')),
-                            unit=lab_data.get('unit', ''),
-                            is_abnormal=lab_data.get('is_abnormal', False),
-                            abnormal_flag=lab_data.get('flag', ''),
-                            extracted_confidence=lab_data.get('confidence', 0.8)
-                        )
-                        session.add(extracted_lab)
-                
-                session.commit()
-                
+            # Extract medications if present
+            medications = llm_analysis.get('medications', [])
+            if isinstance(medications, dict):
+                medications = medications.get('medications', [])
+            
+            medication_rows = [
+                {
+                    'document_id': document_id,
+                    'medication_name': med_data.get('name', ''),
+                    'dosage': med_data.get('dose', ''),
+                    'frequency': med_data.get('frequency', ''),
+                    'duration': med_data.get('duration', ''),
+                    'instructions': med_data.get('instructions', ''),
+                    'extracted_confidence': med_data.get('confidence', 0.8)
+                }
+                for med_data in medications if isinstance(med_data, dict)
+            ]
+            
+            # Extract lab values if present
+            lab_values = llm_analysis.get('extracted_values', [])
+            if isinstance(lab_values, dict):
+                lab_values = lab_values.get('values', [])
+            
+            lab_rows = [
+                {
+                    'document_id': document_id,
+                    'test_name': lab_data.get('test', ''),
+                    'value': str(lab_data.get('value', '')),
+                    'unit': lab_data.get('unit', ''),
+                    'is_abnormal': lab_data.get('is_abnormal', False),
+                    'abnormal_flag': lab_data.get('flag', ''),
+                    'extracted_confidence': lab_data.get('confidence', 0.8)
+                }
+                for lab_data in lab_values if isinstance(lab_data, dict)
+            ]
         except Exception as e:
             self.logger.error(f"Failed to extract structured data: {e}")
             # Don't raise - this is non-critical
+            return
+        
+        # One multi-row INSERT per table
+        if medication_rows:
+            session.execute(insert(ExtractedMedication), medication_rows)
+        if lab_rows:
+            session.execute(insert(ExtractedLabValue), lab_rows)
     
     def _add_system_tags(self, session, document_id: int, document_type: str):
         """Add system-generated tags based on document type"""
-        tag_mappings = {
-            'ecg': ['cardiology', 'heart', 'diagnostic'],
-            'blood_test': ['laboratory', 'blood', 'test_results'],
-            'prescription': ['medication', 'pharmacy', 'treatment'],
-            'radiology': ['imaging', 'diagnostic', 'radiology'],
-            'lab_report': ['laboratory', 'test_results', 'clinical'],
-            'medical_document': ['medical', 'healthcare', 'clinical']
-        }
-        
-        tags = tag_mappings.get(document_type, ['medical', 'document'])
+        tags = _SYSTEM_TAGS.get(document_type, _DEFAULT_SYSTEM_TAGS)
         
-        for tag_name in tags:
-            tag = DocumentTag(
-                document_id=document_id,
-                tag_name=tag_name,
-                tag_type='system'
-            )
-            session.add(tag)
+        session.execute(insert(DocumentTag), [
+            {'document_id': document_id, 'tag_name': tag_name, 'tag_type': TagType.SYSTEM}
+            for tag_name in tags
+        ])
     
     def get_user_documents(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
         """Get user's document analyses with summaries"""
         try:
             with self.db_service.get_session() as session:
+                # Summaries and tags are loaded for all documents in one query each,
+                # reading only the columns the listing shows
                 documents = session.query(DocumentAnalysis)\
+                    .options(selectinload(DocumentAnalysis.summary).load_only(DocumentSummary.short_summary),
+                             selectinload(DocumentAnalysis.tags).load_only(DocumentTag.tag_name))\
                     .filter(DocumentAnalysis.user_id == user_id)\
-                    .order_by(DocumentAnalysis.created_at.desc())\
+                    .order_by(DocumentAnalysis.created_at.desc(), DocumentAnalysis.id.desc())\
                     .limit(limit)\
                     .all()
                 
                 result = []
                 for doc in documents:
-                    # Get summary
-                    summary = session.query(DocumentSummary)\
-                        .filter(DocumentSummary.document_id == doc.id)\
-                        .first()
-                    
-                    # Get tags
-                    tags = session.query(DocumentTag)\
-                        .filter(DocumentTag.document_id == doc.id)\
-                        .all()
+                    summary = doc.summary
+                    tags = doc.tags
                     
                     doc_data = {
                         'id': doc.id,
@@ -260,11 +300,41 @@ class DocumentService:
             return []
     
     def get_document_details(self, document_id: int, user_id: int) -> Optional[Dict[str, Any]]:
-        """Get detailed information about a specific document"""
+        """Get detailed information about a specific document, cached per document"""
+        key = (document_id, user_id)
+        with self._details_lock:
+            details = self._details_cache.get(key)
+            if details is not None:
+                self._details_cache.move_to_end(key)
+                return details
+        
+        details = self._load_document_details(document_id, user_id)
+        if details is not None:
+            with self._details_lock:
+                self._details_cache[key] = details
+                self._details_cache.move_to_end(key)
+                if len(self._details_cache) > DOCUMENT_DETAILS_CACHE_SIZE:
+                    self._details_cache.popitem(last=False)
+        return details
+    
+    def _invalidate_document_details(self, document_id: int):
+        """Drop cached details for a document after it changes"""
+        with self._details_lock:
+            for key in [key for key in self._details_cache if key[0] == document_id]:
+                del self._details_cache[key]
+    
+    def _load_document_details(self, document_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """Query detailed information about a specific document"""
         try:
             with self.db_service.get_session() as session:
-                # Get main document
+                # Get main document with its summary joined in; extracted data and
+                # tags are each loaded by one more query when the document is found
                 doc = session.query(DocumentAnalysis)\
+                    .options(undefer_group('content'),
+                             joinedload(DocumentAnalysis.summary),
+                             selectinload(DocumentAnalysis.extracted_medications),
+                             selectinload(DocumentAnalysis.extracted_lab_values),
+                             selectinload(DocumentAnalysis.tags))\
                     .filter(DocumentAnalysis.id == document_id)\
                     .filter(DocumentAnalysis.user_id == user_id)\
                     .first()
@@ -272,25 +342,10 @@ class DocumentService:
                 if not doc:
                     return None
                 
-                # Get summary
-                summary = session.query(DocumentSummary)\
-                    .filter(DocumentSummary.document_id == document_id)\
-                    .first()
-                
-                # Get extracted medications
-                medications = session.query(ExtractedMedication)\
-                    .filter(ExtractedMedication.document_id == document_id)\
-                    .all()
-                
-                # Get extracted lab values
-                lab_values = session.query(ExtractedLabValue)\
-                    .filter(ExtractedLabValue.document_id == document_id)\
-                    .all()
-                
-                # Get tags
-                tags = session.query(DocumentTag)\
-                    .filter(DocumentTag.document_id == document_id)\
-                    .all()
+                summary = doc.summary
+                medications = doc.extracted_medications
+                lab_values = doc.extracted_lab_values
+                tags = doc.tags
                 
                 # Compile detailed response
                 return {
@@ -304,12 +359,12 @@ class DocumentService:
                         'processing_duration': doc.processing_duration,
                         'created_at': doc.created_at.isoformat()
                     },
-                    'analysis': json.loads(doc.llm_analysis) if doc.llm_analysis else {},
+                    'analysis': json_loads(doc.llm_analysis) if doc.llm_analysis else {},
                     'summary': {
                         'short': summary.short_summary if summary else '',
                         'detailed': summary.detailed_summary if summary else '',
-                        'key_points': json.loads(summary.key_points) if summary and summary.key_points else [],
-                        'action_items': json.loads(summary.action_items) if summary and summary.action_items else []
+                        'key_points': (summary.key_points if summary else None) or [],
+                        'action_items': (summary.action_items if summary else None) or []
                     },
                     'extracted_data': {
                         'medications': [
@@ -343,33 +398,30 @@ class DocumentService:
         """Add a user-defined tag to a document"""
         try:
             with self.db_service.get_session() as session:
-                # Verify document belongs to user
-                doc = session.query(DocumentAnalysis)\
-                    .filter(DocumentAnalysis.id == document_id)\
-                    .filter(DocumentAnalysis.user_id == user_id)\
-                    .first()
-                
-                if not doc:
-                    return False
-                
-                # Check if tag already exists
-                existing_tag = session.query(DocumentTag)\
-                    .filter(DocumentTag.document_id == document_id)\
-                    .filter(DocumentTag.tag_name == tag_name.lower().strip())\
-                    .first()
+                tag_name = tag_name.lower().strip()
+                
+                # Insert the tag in one statement, only if the document belongs
+                # to the user and does not have the tag yet
+                already_tagged = exists().where(DocumentTag.document_id == document_id,
+                                                DocumentTag.tag_name == tag_name)
+                new_tag = select(DocumentAnalysis.id,
+                                 literal(tag_name),
+                                 literal(TagType.USER, DocumentTag.tag_type.type))\
+                    .where(DocumentAnalysis.id == document_id,
+                           DocumentAnalysis.user_id == user_id,
+                           ~already_tagged)
+                inserted = session.execute(
+                    insert(DocumentTag).from_select(['document_id', 'tag_name', 'tag_type'], new_tag)
+                ).rowcount
+                session.commit()
                 
-                if existing_tag:
-                    return True  # Tag already exists
+                if inserted:
+                    self._invalidate_document_details(document_id)
+                    return True
                 
-                # Add new tag
-                new_tag = DocumentTag(
-                    document_id=document_id,
-                    tag_name=tag_name.lower().strip(),
-                    tag_type='user'
-                )
-                session.add(new_tag)
-                session.commit()
-                return True
+                # Nothing inserted: either the tag already exists or the document is not the user's
+                return session.query(exists().where(DocumentAnalysis.id == document_id,
+                                                    DocumentAnalysis.user_id == user_id)).scalar()
                 
         except Exception as e:
             self.logger.error(f"Failed to add user tag: {e}")
@@ -385,22 +437,46 @@ class DocumentService:
                 if document_type:
                     base_query = base_query.filter(DocumentAnalysis.document_type == document_type)
                 
-                # Search in file name, text content, and analysis
-                search_terms = query.lower().split()
+                # Search in file name, text content, and analysis. Terms long enough
+                # for the full-text index are matched there; the rest use LIKE.
+                query = query.lower().strip()
+                search_terms = query.split()
+                indexed_terms = []
+                if self.db_service.full_text_search:
+                    indexed_terms = [term for term in search_terms
+                                     if len(term) >= DOCUMENT_SEARCH_MIN_TERM_LENGTH]
+                matches = None
+                if indexed_terms:
+                    matches = self.db_service.match_documents(indexed_terms).subquery()
+                    base_query = base_query.join(matches, DocumentAnalysis.id == matches.c.rowid)\
+                        .add_columns(matches.c.rank)
+                
                 for term in search_terms:
+                    if term in indexed_terms:
+                        continue
+                    # SQLite's LIKE already ignores ASCII case, so the columns are not
+                    # lowercased per row as ilike would; the term binds as one escaped parameter
                     base_query = base_query.filter(
-                        (DocumentAnalysis.file_name.ilike(f'%{term}%')) |
-                        (DocumentAnalysis.text_content.ilike(f'%{term}%')) |
-                        (DocumentAnalysis.llm_analysis.ilike(f'%{term}%'))
+                        DocumentAnalysis.file_name.contains(term, autoescape=True) |
+                        DocumentAnalysis.text_content.contains(term, autoescape=True) |
+                        DocumentAnalysis.llm_analysis.contains(term, autoescape=True)
                     )
                 
-                documents = base_query.order_by(DocumentAnalysis.created_at.desc()).all()
+                base_query = base_query.options(selectinload(DocumentAnalysis.summary))\
+                    .order_by(DocumentAnalysis.created_at.desc(), DocumentAnalysis.id.desc())
+                if matches is not None:
+                    # Rank by the index's bm25 score, so the text is never loaded
+                    scored_documents = [(doc, -rank) for doc, rank in base_query.all()]
+                else:
+                    # Relevance scoring reads the text, so load it with the rows
+                    scored_documents = [
+                        (doc, self._calculate_relevance_score(doc, query))
+                        for doc in base_query.options(undefer(DocumentAnalysis.text_content)).all()
+                    ]
                 
                 result = []
-                for doc in documents:
-                    summary = session.query(DocumentSummary)\
-                        .filter(DocumentSummary.document_id == doc.id)\
-                        .first()
+                for doc, relevance_score in scored_documents:
+                    summary = doc.summary
                     
                     doc_data = {
                         'id': doc.id,
@@ -409,7 +485,7 @@ class DocumentService:
                         'confidence_score': doc.confidence_score,
                         'created_at': doc.created_at.isoformat(),
                         'short_summary': summary.short_summary if summary else '',
-                        'relevance_score': self._calculate_relevance_score(doc, query)
+                        'relevance_score': relevance_score
                     }
                     result.append(doc_data)
                 
@@ -422,20 +498,19 @@ class DocumentService:
             return []
     
     def _calculate_relevance_score(self, document: DocumentAnalysis, query: str) -> float:
-        """Calculate relevance score for search results"""
+        """Calculate relevance score for search results, given a lowercased query"""
         score = 0.0
-        query_lower = query.lower()
         
         # File name match (high weight)
-        if query_lower in document.file_name.lower():
+        if query in document.file_name.lower():
             score += 0.5
         
         # Document type match
-        if query_lower in document.document_type.lower():
+        if query in document.document_type.lower():
             score += 0.3
         
         # Text content matches (lower weight due to potentially large text)
-        if document.text_content and query_lower in document.text_content.lower():
+        if document.text_content and query in document.text_content.lower():
             score += 0.2
         
         return score
@@ -444,40 +519,35 @@ class DocumentService:
         """Get statistics about user's documents"""
         try:
             with self.db_service.get_session() as session:
-                documents = session.query(DocumentAnalysis)\
-                    .filter(DocumentAnalysis.user_id == user_id)\
+                # Aggregate per document type in SQL; unset or zero confidence
+                # scores are left out of the average
+                confidence = func.nullif(DocumentAnalysis.confidence_score, 0)
+                type_rows = session.query(
+                    DocumentAnalysis.document_type,
+                    func.count(),
+                    func.coalesce(func.sum(DocumentAnalysis.file_size_bytes), 0),
+                    func.coalesce(func.sum(confidence), 0),
+                    func.count(confidence)
+                ).filter(DocumentAnalysis.user_id == user_id)\
+                    .group_by(DocumentAnalysis.document_type)\
                     .all()
-                
-                if not documents:
-                    return {'total_documents': 0}
-                
-                # Calculate statistics
-                total_docs = len(documents)
-                doc_types = {}
-                total_size = 0
-                confidence_scores = []
-                
-                for doc in documents:
-                    # Count by type
-                    doc_type = doc.document_type
-                    doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-                    
-                    # Total size
-                    total_size += doc.file_size_bytes or 0
-                    
-                    # Confidence scores
-                    if doc.confidence_score:
-                        confidence_scores.append(doc.confidence_score)
-                
-                avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
-                
-                return {
-                    'total_documents': total_docs,
-                    'document_types': doc_types,
-                    'total_size_mb': total_size / (1024 * 1024),
-                    'average_confidence': avg_confidence,
-                    'most_common_type': max(doc_types, key=doc_types.get) if doc_types else 'unknown'
-                }
+            
+            if not type_rows:
+                return {'total_documents': 0}
+            
+            doc_types = {doc_type: count for doc_type, count, _, _, _ in type_rows}
+            total_size = sum(size for _, _, size, _, _ in type_rows)
+            confidence_total = sum(total for _, _, _, total, _ in type_rows)
+            confidence_count = sum(count for _, _, _, _, count in type_rows)
+            avg_confidence = confidence_total / confidence_count if confidence_count else 0
+            
+            return {
+                'total_documents': sum(doc_types.values()),
+                'document_types': doc_types,
+                'total_size_mb': total_size / (1024 * 1024),
+                'average_confidence': avg_confidence,
+                'most_common_type': max(doc_types, key=doc_types.get)
+            }
                 
         except Exception as e:
             self.logger.error(f"Failed to get document statistics: {e}")
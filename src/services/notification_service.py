@@ -4,7 +4,6 @@ Notification service for managing reminders and alerts
 
 import threading
 import time
-import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from plyer import notification
@@ -91,13 +90,13 @@ class NotificationService:
             current_time = datetime.now()
             
             with self.db_service.get_session() as session:
-                from models.database_models import Appointment
+                from models.database_models import Appointment, AppointmentStatus
                 
                 # Check appointments in the next 24 hours
                 upcoming_appointments = session.query(Appointment).filter(
                     Appointment.appointment_date >= current_time,
                     Appointment.appointment_date <= current_time + timedelta(hours=24),
-                    Appointment.status == 'scheduled',
+                    Appointment.status == AppointmentStatus.SCHEDULED,
                     Appointment.reminder_enabled == True
                 ).all()
                 
@@ -114,9 +113,7 @@ class NotificationService:
             if not medication.reminder_times:
                 return False
             
-            reminder_times = json.loads(medication.reminder_times)
-            
-            for reminder_time_str in reminder_times:
+            for reminder_time_str in medication.reminder_times:
                 reminder_time = datetime.strptime(reminder_time_str, "%H:%M").time()
                 reminder_datetime = datetime.combine(current_time.date(), reminder_time)
                 
@@ -137,7 +134,7 @@ class NotificationService:
             if not appointment.reminder_minutes:
                 reminder_minutes = [30, 60, 1440]  # Default: 30min, 1hr, 1day
             else:
-                reminder_minutes = json.loads(appointment.reminder_minutes)
+                reminder_minutes = appointment.reminder_minutes
             
             for minutes in reminder_minutes:
                 reminder_time = appointment.appointment_date - timedelta(minutes=minutes)
@@ -215,9 +212,8 @@ class NotificationService:
         # This would update the medication's reminder_times in the database
         if self.db_service:
             try:
-                reminder_times_json = json.dumps(reminder_times)
                 self.db_service.update_medication(medication_id, {
-                    'reminder_times': reminder_times_json,
+                    'reminder_times': reminder_times,
                     'reminder_enabled': True
                 })
                 print(f"Medication reminders scheduled for medication {medication_id}")
@@ -228,7 +224,6 @@ class NotificationService:
         """Schedule appointment reminders"""
         if self.db_service:
             try:
-                reminder_minutes_json = json.dumps(reminder_minutes)
                 # You would update the appointment's reminder settings here
                 print(f"Appointment reminders scheduled for appointment {appointment_id}")
             except Exception as e:
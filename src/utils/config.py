@@ -40,6 +40,25 @@ class Config:
         backup_path.mkdir(exist_ok=True)
         return str(backup_path)
     
+    @property
+    def log_path(self) -> str:
+        """Get application log file path"""
+        logs_path = self.data_dir / 'logs'
+        logs_path.mkdir(exist_ok=True)
+        return str(logs_path / 'app.log')
+    
+    @property
+    def llm_cache_path(self) -> str:
+        """Get LLM response cache file path"""
+        return str(self.data_dir / 'llm_cache.db')
+    
+    @property
+    def llm_batches_dir(self) -> str:
+        """Get directory for submitted LLM batch job manifests"""
+        batches_path = self.data_dir / 'llm_batches'
+        batches_path.mkdir(exist_ok=True)
+        return str(batches_path)
+    
     def get_app_settings(self) -> Dict[str, Any]:
         """Get application settings"""
         return {
@@ -62,4 +81,18 @@ class Config:
             'default_reminder_minutes': [30, 60, 1440],  # 30min, 1hr, 1day
             'notification_sound': True,
             'vibration': True
-        }
\ No newline at end of file
+        }
+    
+    def get_llm_settings(self) -> Dict[str, Any]:
+        """Get LLM integration settings"""
+        return {
+            'model': 'gpt-3.5-turbo',
+            'temperature': 0.3,
+            'response_cache_enabled': True,
+            'response_cache_ttl_seconds': int(os.environ.get('HEALTH_LLM_CACHE_TTL', 7 * 24 * 3600)),
+            'response_cache_size_mb': int(os.environ.get('HEALTH_LLM_CACHE_MB', 512)),
+            'local_model_enabled': os.environ.get('HEALTH_ENABLE_LOCAL_LLM') == '1',
+            'micro_batch_window_seconds': 0.25,
+            'micro_batch_max_size': 8,
+            'micro_batch_max_tokens': 2000  # output tokens asked for by one batched request
+        }
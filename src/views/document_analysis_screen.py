@@ -22,7 +22,7 @@ from typing import Dict, Any, Optional
 
 from src.views.base_screen import BaseScreen
 from src.services.document_processing_service import DocumentProcessingService
-from llm.health_llm_service import HealthLLMService
+from llm.health_llm_service import get_health_llm_service
 
 
 class DocumentAnalysisScreen(BaseScreen):
@@ -32,7 +32,7 @@ class DocumentAnalysisScreen(BaseScreen):
         super().__init__(**kwargs)
         self.title = "Document Analysis"
         self.document_service = DocumentProcessingService()
-        self.llm_service = HealthLLMService()
+        self.llm_service = get_health_llm_service()
         self.file_manager = None
         self.current_file_path = None
         self.analysis_dialog = None
@@ -317,6 +317,7 @@ class DocumentAnalysisScreen(BaseScreen):
         
         content.add_widget(progress_label)
         content.add_widget(progress_bar)
+        self.progress_label = progress_label
         
         self.progress_dialog = MDDialog(
             title="Analyzing Document",
@@ -334,7 +335,20 @@ class DocumentAnalysisScreen(BaseScreen):
             
             # Step 2: Analyze with LLM
             if not document_data.get('error'):
-                llm_analysis = self.llm_service.analyze_document_comprehensive(document_data)
+                progress = {'characters': 0, 'pending': False}
+                
+                def show_received(dt):
+                    progress['pending'] = False
+                    self.update_progress_text(f"Receiving analysis... {progress['characters']} characters")
+                
+                def on_token(text):
+                    # Show progress as the analysis streams in, with at most one update queued
+                    progress['characters'] += len(text)
+                    if not progress['pending']:
+                        progress['pending'] = True
+                        Clock.schedule_once(show_received, 0)
+                
+                llm_analysis = self.llm_service.analyze_document_comprehensive(document_data, on_token=on_token)
                 document_data['llm_analysis'] = llm_analysis
             
             # Step 3: Update UI on main thread
@@ -350,6 +364,11 @@ class DocumentAnalysisScreen(BaseScreen):
                 0
             )
     
+    def update_progress_text(self, text: str):
+        """Update the progress dialog message"""
+        if self.progress_dialog and getattr(self, 'progress_label', None):
+            self.progress_label.text = text
+    
     def display_analysis_results(self, results: Dict[str, Any]):
         """Display analysis results in UI"""
         # Close progress dialog
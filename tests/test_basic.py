@@ -4,13 +4,21 @@ Basic tests for the Health Management App
 
 import sys
 import os
+import sqlite3
+import tempfile
 import unittest
 from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy import inspect
 
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from utils.config import Config
+from models.database_models import AppointmentStatus, Medication
+from services.database_service import DatabaseService, data_version
 
 
 class TestConfig(unittest.TestCase):
@@ -41,18 +49,129 @@ class TestDatabaseService(unittest.TestCase):
     """Test database service"""
     
     def setUp(self):
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+        # Each test gets its own initialized database in a temporary directory
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.db_path = os.path.join(temp_dir.name, 'health_data.db')
+        self.db_service = DatabaseService()
+        self.db_service.config = SimpleNamespace(database_path=self.db_path)
+        self.db_service.initialize_database()
+        self.addCleanup(self.db_service.close_connection)
         
     def test_import_database_service(self):
         """Test that database service can be imported"""
-        try:
-            from services.database_service import DatabaseService
-            db_service = DatabaseService()
-            self.assertIsNotNone(db_service)
-        except ImportError as e:
-            self.fail(f"Could not import DatabaseService: {e}")
+        self.assertIsNotNone(self.db_service)
+
+    def test_indexes_added_to_existing_database(self):
+        """Test indexes missing from an older database file are created"""
+        self.db_service.engine.dispose()
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("DROP INDEX ix_appointments_user_status_date")
+        connection.commit()
+        connection.close()
+
+        self.db_service.initialize_database()
+        self.db_service.engine.dispose()
+
+        connection = sqlite3.connect(self.db_path)
+        indexes = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )}
+        connection.close()
+
+        self.assertIn('ix_appointments_user_status_date', indexes)
+        self.assertIn('ix_document_analyses_user_created', indexes)
+        self.assertIn('ix_document_analyses_user_type', indexes)
+
+    def test_timestamps_stamped_by_database(self):
+        """Test created_at and updated_at are filled in by SQLite"""
+        self.db_service.engine.dispose()
+        connection = sqlite3.connect(self.db_path)
+        # An explicit NULL, as written by databases created without server defaults
+        connection.execute(
+            "INSERT INTO settings (key, value, created_at, updated_at) VALUES ('units', 'metric', NULL, NULL)"
+        )
+        connection.execute("UPDATE settings SET updated_at = '2000-01-01 00:00:00' WHERE key = 'units'")
+        connection.execute("UPDATE settings SET value = 'imperial' WHERE key = 'units'")
+        created_at, updated_at = connection.execute(
+            "SELECT created_at, updated_at FROM settings WHERE key = 'units'"
+        ).fetchone()
+        connection.close()
+
+        self.assertIsNotNone(created_at)
+        self.assertGreater(updated_at, '2000-01-01 00:00:00')
+
+    def test_updated_rows_readable_after_session_closes(self):
+        """Test updated_at is loaded for a row updated inside a session"""
+        medication = self.db_service.add_medication({'user_id': 1, 'name': 'Aspirin', 'dosage': '1',
+                                                     'frequency': 'daily', 'start_date': datetime(2024, 1, 1)})
+
+        with self.db_service.get_session() as session:
+            updated = session.get(Medication, medication.id)
+            updated.dosage = '2'
+
+        self.assertIsNotNone(updated.updated_at)
+        self.assertEqual(updated.dosage, '2')
+
+    def test_status_names_converted_to_enum_values(self):
+        """Test status names stored by an older database are read back as enums"""
+        self.db_service.engine.dispose()
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("INSERT INTO users (id, first_name, last_name) VALUES (1, 'Test', 'User')")
+        connection.execute(
+            "INSERT INTO appointments (user_id, title, appointment_date, status) "
+            "VALUES (1, 'Checkup', '2999-01-01 09:00:00', 'scheduled')"
+        )
+        connection.commit()
+        connection.close()
+
+        self.db_service.initialize_database()
+        appointments = self.db_service.get_upcoming_appointments(1)
+
+        self.assertEqual([appointment.status for appointment in appointments], [AppointmentStatus.SCHEDULED])
+
+    def test_returned_rows_are_detached_and_loaded(self):
+        """Test getters return detached rows whose columns read without a session"""
+        user = self.db_service.create_user({'first_name': 'Test', 'last_name': 'User'})
+        self.db_service.add_medication({'user_id': user.id, 'name': 'Aspirin', 'start_date': datetime(2024, 1, 1)})
+        medications = self.db_service.get_active_medications(user.id)
+        self.db_service.release_sessions()
+
+        self.assertTrue(inspect(user).detached)
+        self.assertIsNotNone(user.created_at)
+        self.assertTrue(all(inspect(medication).detached for medication in medications))
+        self.assertEqual([medication.name for medication in medications], ['Aspirin'])
+
+    def test_settings_cached_until_updated(self):
+        """Test setting reads are served from memory and see updates"""
+        self.assertEqual(self.db_service.get_setting('theme'), 'light')
+        self.db_service.update_setting('theme', 'dark')
+        with patch.object(self.db_service, 'get_session', side_effect=AssertionError("database used")):
+            self.assertEqual(self.db_service.get_setting('theme'), 'dark')
+
+    def test_bulk_add_medical_reports(self):
+        """Test reports added in bulk are all stored"""
+        user = self.db_service.create_user({'first_name': 'Test', 'last_name': 'User'})
+        self.db_service.bulk_add_medical_reports([
+            {'user_id': user.id, 'title': f'Report {day}', 'report_date': datetime(2024, 1, day)}
+            for day in range(1, 4)
+        ])
+        reports = self.db_service.get_medical_reports(user.id)
+        self.db_service.release_sessions()
+
+        self.assertEqual([report.title for report in reports], ['Report 3', 'Report 2', 'Report 1'])
+        self.assertTrue(all(report.created_at for report in reports))
+
+    def test_data_version_counts_writes(self):
+        """Test writing a table bumps only that table's data version"""
+        settings_version = data_version('settings')
+        medications_version = data_version('medications')
+        self.db_service.update_setting('units', 'imperial')
+
+        self.assertGreater(data_version('settings'), settings_version)
+        self.assertEqual(data_version('medications'), medications_version)
 
 
 if __name__ == '__main__':
     # Run tests
-    unittest.main()
\ No newline at end of file
+    unittest.main()